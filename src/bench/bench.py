@@ -0,0 +1,419 @@
+"""
+Reproducible benchmarks for the engine, generator, solvers and renderer.
+
+    python -m bench.bench --output bench.json
+    python -m bench.bench --baseline bench/baseline.json      # flag regressions
+    python -m bench.bench --save-baseline bench/baseline.json
+
+Every benchmark runs on seeded inputs and reports the best of '--repeat' runs.
+Benchmarks whose optional dependency (NumPy, pygame) is missing are skipped.
+"""
+import argparse
+import contextlib
+import copy
+import json
+import os
+import platform
+import random
+import tempfile
+import time
+
+from game.compact import CompactGame
+from game.game import Game
+
+DEFAULT_THRESHOLD = 0.2  # Relative slowdown reported as a regression
+
+BENCHMARKS = []
+
+
+def benchmark(name, unit, higher_is_better=True):
+    """
+    Register a benchmark. The function returns the measured value in 'unit'.
+    """
+    def register(function):
+        BENCHMARKS.append((name, unit, higher_is_better, function))
+        return function
+    return register
+
+
+def seeded_game(seed, num_bottles=14, capacity=4, num_colors=12):
+    random.seed(seed)
+    return Game(num_bottles, capacity, num_colors)
+
+
+def legal_walks(seed, count):
+    """
+    About 'count' random legal moves from 'seeded_game(seed)', as a list of walks that
+    each start from the initial puzzle: replaying them times accepted moves rather than
+    the rejection path. A walk avoids moves into a position with no legal move and
+    ends when every move leads to one.
+    """
+    game = seeded_game(seed)
+    rng = random.Random(seed)
+    walks = []
+    total = 0
+    while total < count:
+        moves = []
+        while total + len(moves) < count:
+            legal = game.legal_moves()
+            rng.shuffle(legal)
+            for move in legal:
+                game.move(*move)
+                if game.legal_moves():
+                    break
+                game.undo()
+            else:
+                break
+            moves.append(move)
+        if not moves:
+            break
+        walks.append(moves)
+        total += len(moves)
+        game.rewind(0)
+    return walks
+
+
+def restart(game):
+    game.puzzle = copy.deepcopy(game.initial_puzzle)
+    game.refresh_tracking()
+
+
+@contextlib.contextmanager
+def quiet():
+    """
+    Send the engine's per-call messages to /dev/null, keeping terminal I/O out of timings.
+    """
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+class ListGame:
+    """
+    The engine's move before per-bottle tracking: every call rescans the source's top
+    run. Kept here as the reference 'game_move_vs_list' is measured against.
+    """
+    def __init__(self, puzzle, capacity):
+        self.puzzle = copy.deepcopy(puzzle)
+        self.capacity = capacity
+        self.num_bottles = len(puzzle)
+        self.moves_history = []
+
+    def move(self, source, destination, record=True):
+        if not (0 <= source < self.num_bottles) or not (0 <= destination < self.num_bottles):
+            return False
+        source_bottle = self.puzzle[source]
+        dest_bottle = self.puzzle[destination]
+        if not source_bottle:
+            return False
+        top_color = source_bottle[-1]
+        if dest_bottle and dest_bottle[-1] != top_color:
+            return False
+        move_count = 0
+        while move_count < len(source_bottle) and source_bottle[-(move_count + 1)] == top_color:
+            move_count += 1
+        if move_count > self.capacity - len(dest_bottle):
+            return False
+        dest_bottle.extend(source_bottle[-move_count:])
+        del source_bottle[-move_count:]
+        if record:
+            self.moves_history.append((source, destination))
+        return True
+
+
+def _replay(new_game, moves):
+    move = new_game().move
+    start = time.perf_counter()
+    for source, destination in moves:
+        move(source, destination, record=False)
+    return time.perf_counter() - start
+
+
+def _move_rate(new_game, walks):
+    """
+    Accepted moves per second replaying 'walks', each on a fresh board from 'new_game()'.
+    """
+    elapsed = sum(_replay(new_game, moves) for moves in walks)
+    return sum(len(moves) for moves in walks) / elapsed
+
+
+def _move_speedup(new_game, new_reference, walks):
+    """
+    How many times faster 'new_game()' boards replay 'walks' than 'new_reference()'
+    boards. Both replay each walk back to back, so drift in machine speed cancels out.
+    """
+    elapsed = reference_elapsed = 0.0
+    for moves in walks:
+        reference_elapsed += _replay(new_reference, moves)
+        elapsed += _replay(new_game, moves)
+    return reference_elapsed / elapsed
+
+
+def _game_factory(game):
+    def new_game():
+        restart(game)
+        return game
+    return new_game
+
+
+@benchmark("game_move", "moves/s")
+def bench_move():
+    game = seeded_game(0)
+    return _move_rate(_game_factory(game), legal_walks(0, 200_000))
+
+
+@benchmark("game_move_vs_list", "x")
+def bench_move_vs_list():
+    """
+    'Game.move' speed relative to 'ListGame.move' on the same walks (above 1 is faster).
+    """
+    game = seeded_game(0)
+    walks = legal_walks(0, 200_000)
+    return _move_speedup(_game_factory(game), lambda: ListGame(game.initial_puzzle, game.capacity), walks)
+
+
+def _compact_factory(game):
+    def new_game():
+        compact = CompactGame(game.num_bottles, game.capacity, game.num_colors)
+        compact.puzzle = game.initial_puzzle
+        return compact
+    return new_game
+
+
+@benchmark("compact_move", "moves/s")
+def bench_compact_move():
+    game = seeded_game(0)
+    return _move_rate(_compact_factory(game), legal_walks(0, 200_000))
+
+
+@benchmark("compact_move_vs_game", "x")
+def bench_compact_move_vs_game():
+    """
+    'CompactGame.move' speed relative to 'Game.move' on the same walks (above 1 is faster).
+    """
+    game = seeded_game(0)
+    walks = legal_walks(0, 200_000)
+    return _move_speedup(_compact_factory(game), _game_factory(game), walks)
+
+
+@benchmark("game_is_solved", "calls/s")
+def bench_is_solved():
+    game = seeded_game(0)
+    calls = 500_000
+    is_solved = game.is_solved
+    start = time.perf_counter()
+    for _ in range(calls):
+        is_solved()
+    return calls / (time.perf_counter() - start)
+
+
+@benchmark("game_generate", "games/s")
+def bench_generate():
+    random.seed(0)
+    count = 20_000
+    start = time.perf_counter()
+    for _ in range(count):
+        Game(14, 4, 12)
+    return count / (time.perf_counter() - start)
+
+
+@benchmark("bulk_generate", "puzzles/s")
+def bench_bulk_generate():
+    from game.generator import generate_puzzles
+    count = 100_000
+    start = time.perf_counter()
+    generate_puzzles(14, 4, 12, count, seed=0)
+    return count / (time.perf_counter() - start)
+
+
+def _played_game(seed, moves=200):
+    game = seeded_game(seed)
+    rng = random.Random(seed)
+    for _ in range(moves):
+        legal = game.legal_moves()
+        if not legal:
+            break
+        game.move(*rng.choice(legal))
+    return game
+
+
+@benchmark("csv_round_trip", "games/s")
+def bench_csv_round_trip():
+    game = _played_game(0)
+    count = 300
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "game.csv")
+        replay = Game(game.num_bottles, game.capacity, game.num_colors)
+        with quiet():
+            start = time.perf_counter()
+            for _ in range(count):
+                game.export_game(filename)
+                replay.import_game(filename)
+            return count / (time.perf_counter() - start)
+
+
+@benchmark("record_round_trip", "games/s")
+def bench_record_round_trip():
+    game = _played_game(0)
+    count = 1000
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "game.wsr")
+        replay = Game(game.num_bottles, game.capacity, game.num_colors)
+        with quiet():
+            start = time.perf_counter()
+            for _ in range(count):
+                game.export_record(filename)
+                replay.import_record(filename)
+            return count / (time.perf_counter() - start)
+
+
+def _solver_rate(method, **options):
+    from solver.solver import create_solver
+    nodes = 0
+    elapsed = 0.0
+    for seed in range(20):
+        game = seeded_game(seed, 8, 4, 6)
+        solver = create_solver(method, game.capacity, max_nodes=200_000, **options)
+        solver.solve(game.puzzle)
+        nodes += solver.nodes_expanded
+        elapsed += solver.elapsed
+    return nodes / elapsed
+
+
+@benchmark("astar_nodes", "nodes/s")
+def bench_astar():
+    return _solver_rate("astar")
+
+
+@benchmark("idastar_nodes", "nodes/s")
+def bench_idastar():
+    return _solver_rate("idastar")
+
+
+@benchmark("gui_draw_full", "ms/frame", higher_is_better=False)
+def bench_draw_full():
+    gui = _headless_gui()
+    frames = 200
+    start = time.perf_counter()
+    for _ in range(frames):
+        gui.full_redraw = True
+        gui.draw_puzzle()
+    return (time.perf_counter() - start) * 1000 / frames
+
+
+@benchmark("gui_draw_move", "ms/frame", higher_is_better=False)
+def bench_draw_move():
+    gui = _headless_gui()
+    walks = legal_walks(0, 2000)
+    elapsed = 0.0
+    for moves in walks:
+        restart(gui.game)
+        gui.full_redraw = True
+        gui.draw_puzzle()
+        start = time.perf_counter()
+        for source, destination in moves:
+            gui.mark_dirty(source, destination)
+            gui.game.move(source, destination, record=False)
+            gui.draw_puzzle()
+        elapsed += time.perf_counter() - start
+    return elapsed * 1000 / sum(len(moves) for moves in walks)
+
+
+@benchmark("cli_solve_startup", "ms", higher_is_better=False)
+def bench_cli_startup():
+    """
+    Wall time of a short-lived headless 'main.py solve' process, import cost included.
+    """
+    import subprocess
+    import sys
+    source_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    command = [sys.executable, "main.py", "solve", "--seed", "0", "--bottles", "5", "--colors", "3"]
+    runs = 10
+    start = time.perf_counter()
+    for _ in range(runs):
+        subprocess.run(command, cwd=source_dir, stdout=subprocess.DEVNULL, check=True)
+    return (time.perf_counter() - start) * 1000 / runs
+
+
+def _headless_gui():
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    from game.gui import GameGUI
+    return GameGUI(seeded_game(0))
+
+
+def run(names=None, repeat=3):
+    """
+    Run the benchmarks (all, or those in 'names') and return the results dict.
+    """
+    results = {}
+    for name, unit, higher_is_better, function in BENCHMARKS:
+        if names and name not in names:
+            continue
+        try:
+            values = [function() for _ in range(repeat)]
+        except ImportError as e:
+            print(f"{name:20s} skipped ({e})")
+            continue
+        value = max(values) if higher_is_better else min(values)
+        results[name] = {"value": value, "unit": unit, "higher_is_better": higher_is_better}
+        print(f"{name:20s} {value:14.2f} {unit}")
+    return results
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Return the benchmarks that got worse than 'baseline' by more than 'threshold'.
+    """
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get(name)
+        if reference is None or not reference["value"]:
+            continue
+        if result["higher_is_better"]:
+            change = reference["value"] / result["value"] - 1 if result["value"] else float("inf")
+        else:
+            change = result["value"] / reference["value"] - 1
+        if change > threshold:
+            regressions.append({"name": name, "value": result["value"], "baseline": reference["value"],
+                                "slowdown": change})
+    return regressions
+
+
+def add_arguments(parser):
+    parser.add_argument("names", nargs="*", help="Benchmarks to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", default=None, help="Write results JSON to this file")
+    parser.add_argument("--baseline", default=None, help="Compare against this results file")
+    parser.add_argument("--save-baseline", default=None, help="Write results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+
+def main(args):
+    """
+    Run the benchmarks selected by parsed 'args'. Returns the exit status.
+    """
+    results = run(args.names, args.repeat)
+    document = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+    for filename in (args.output, args.save_baseline):
+        if filename:
+            with open(filename, "w") as output:
+                json.dump(document, output, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression['name']}: {regression['value']:.2f} vs baseline "
+                  f"{regression['baseline']:.2f} ({regression['slowdown']:.0%} slower)")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the performance benchmarks.")
+    add_arguments(parser)
+    raise SystemExit(main(parser.parse_args()))
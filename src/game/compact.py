@@ -0,0 +1,259 @@
+import random
+from array import array
+
+from util.util import print_error
+from util import metrics
+from game.state import GameState
+from game.game import Game
+
+
+class CompactGame:
+    """
+    Memory-dense alternative to 'Game' for hosting many sessions in one process.
+
+    All bottles live in one bytearray of 'num_bottles * capacity' cells (bottom first)
+    next to per-bottle byte arrays of height, top color and top run length, and the
+    instance uses __slots__. 'move' keeps the tops up to date, so it only scans a
+    bottle when a pour uncovers a new run, and it leaves poured-out cells as they
+    were: cells above a bottle's height are stale and never read.
+    The public surface matches 'Game': 'move', 'is_solved', 'export_game',
+    'import_game', and 'puzzle' / 'initial_puzzle' / 'moves_history' are exposed as
+    list views built on demand.
+    """
+    __slots__ = (
+        "GAMESTATE", "num_bottles", "capacity", "num_colors", "is_game_solved",
+        "_cells", "_heights", "_tops", "_runs", "_initial", "_moves",
+    )
+
+    def __init__(self, num_bottles, capacity, num_colors):
+        self._cells = bytearray()
+        self._heights = bytearray()
+        self._tops = bytearray()
+        self._runs = bytearray()
+        self._initial = b""
+        self._moves = array("H")
+        self.is_game_solved = False
+        self.num_bottles = num_bottles
+        self.capacity = capacity
+        self.num_colors = num_colors
+
+        # Same validation as 'Game'
+        if num_bottles < 1:
+            print_error("Number of bottles must be at least 1.")
+            self.GAMESTATE = GameState.FAILURE
+            return
+        if capacity < 1:
+            print_error("Capacity must be at least 1.")
+            self.GAMESTATE = GameState.FAILURE
+            return
+        if num_colors < 1:
+            print_error("Number of colors must be at least 1.")
+            self.GAMESTATE = GameState.FAILURE
+            return
+        if num_colors > 255 or capacity > 255:
+            print_error("Number of colors and capacity must be at most 255.")
+            self.GAMESTATE = GameState.FAILURE
+            return
+        if (num_bottles - num_colors) < 1:
+            print_error("There must be at least one empty bottle to allow for movement.")
+            self.GAMESTATE = GameState.FAILURE
+            return
+
+        self.GAMESTATE = GameState.WAITING
+        self.initialize()
+
+    def initialize(self):
+        # Shuffle the color pool and fill bottles in order, like 'Game.generate_puzzle_state'
+        color_pool = []
+        for color in range(1, self.num_colors + 1):
+            color_pool.extend([color] * self.capacity)
+        random.shuffle(color_pool)
+
+        self._cells = bytearray(self.num_bottles * self.capacity)
+        self._cells[:len(color_pool)] = bytes(color_pool)
+        self._heights = bytearray(
+            min(self.capacity, max(0, len(color_pool) - index * self.capacity))
+            for index in range(self.num_bottles)
+        )
+        self._initial = bytes(self._cells)
+        self.refresh_tracking()
+        self.GAMESTATE = GameState.SUCCESS
+
+    def move(self, source, destination, record=True) -> bool:
+        """
+        Move all the same color from the top of 'source' to 'destination'.
+        Return True if the move is successful, otherwise False.
+        With 'record' False the move is not added to 'moves_history'.
+        """
+        num_bottles = self.num_bottles
+        if not (0 <= source < num_bottles) or not (0 <= destination < num_bottles):
+            if metrics.enabled:
+                metrics.count("game_moves_rejected", reason="bad_index")
+            return False  # Invalid bottle index
+
+        tops = self._tops
+        top_color = tops[source]
+        if not top_color:
+            if metrics.enabled:
+                metrics.count("game_moves_rejected", reason="empty_source")
+            return False  # Empty source bottle
+
+        dest_color = tops[destination]
+        if dest_color and dest_color != top_color:
+            if metrics.enabled:
+                metrics.count("game_moves_rejected", reason="color_mismatch")
+            return False  # Color mismatch
+
+        runs = self._runs
+        move_count = runs[source]
+        heights = self._heights
+        dest_height = heights[destination]
+        capacity = self.capacity
+        if move_count > capacity - dest_height:
+            if metrics.enabled:
+                metrics.count("game_moves_rejected", reason="no_space")
+            return False  # Not enough space in the destination bottle
+
+        # Perform the move in place, no list slicing. The cells the source pours out are
+        # left stale above its new height. A pour into the same bottle is a no-op that
+        # 'Game.move' still accepts and records.
+        if source != destination:
+            cells = self._cells
+            source_height = heights[source] - move_count
+            source_start = source * capacity + source_height
+            dest_start = destination * capacity + dest_height
+            cells[dest_start:dest_start + move_count] = cells[source_start:source_start + move_count]
+            heights[source] = source_height
+            heights[destination] = dest_height + move_count
+            tops[destination] = top_color
+            runs[destination] = runs[destination] + move_count if dest_color else move_count
+
+            # Only the run the pour uncovered has to be scanned
+            if source_height:
+                color = cells[source_start - 1]
+                run = 1
+                while run < source_height and cells[source_start - 1 - run] == color:
+                    run += 1
+                tops[source] = color
+                runs[source] = run
+            else:
+                tops[source] = runs[source] = 0
+        if metrics.enabled:
+            metrics.count("game_moves_accepted")
+            metrics.observe("game_move_cells", move_count)
+
+        if record:
+            self._moves.extend((source, destination))
+        return True
+
+    def reset_history(self):
+        """
+        Forget recorded moves. CompactGame keeps no undo/redo deltas or checkpoints.
+        """
+        self._moves = array("H")
+
+    def is_solved(self):
+        """
+        Check if the game is solved: all bottles should either be empty or filled with one color.
+        """
+        capacity = self.capacity
+        for height, run in zip(self._heights, self._runs):
+            if height and run != capacity:
+                return False
+        return True
+
+    def refresh_tracking(self):
+        """
+        Rebuild the top color and top run of every bottle from the cells.
+        """
+        cells = self._cells
+        capacity = self.capacity
+        self._tops = bytearray(len(self._heights))
+        self._runs = bytearray(len(self._heights))
+        for index, height in enumerate(self._heights):
+            if not height:
+                continue
+            top = index * capacity + height - 1
+            color = cells[top]
+            run = 1
+            while run < height and cells[top - run] == color:
+                run += 1
+            self._tops[index] = color
+            self._runs[index] = run
+
+    def legal_moves(self):
+        """
+        Return every (source, destination) pair that 'move' would accept and that
+        changes the puzzle.
+        """
+        heights = self._heights
+        capacity = self.capacity
+        tops = list(zip(self._tops, self._runs))
+        moves = []
+        for source, (color, run) in enumerate(tops):
+            if not color:
+                continue
+            for destination, (dest_color, _) in enumerate(tops):
+                if destination == source:
+                    continue
+                if (not dest_color or dest_color == color) and capacity - heights[destination] >= run:
+                    moves.append((source, destination))
+        return moves
+
+    def _to_lists(self, cells, heights):
+        capacity = self.capacity
+        return [
+            list(cells[index * capacity:index * capacity + height])
+            for index, height in enumerate(heights)
+        ]
+
+    def _from_lists(self, puzzle):
+        if len(puzzle) != self.num_bottles:
+            raise ValueError(f"Expected {self.num_bottles} bottles, got {len(puzzle)}")
+        capacity = self.capacity
+        cells = bytearray(self.num_bottles * capacity)
+        for index, bottle in enumerate(puzzle):
+            if len(bottle) > capacity:
+                raise ValueError(f"Bottle {index + 1} holds more than {capacity} cells")
+            cells[index * capacity:index * capacity + len(bottle)] = bytes(bottle)
+        return cells
+
+    @property
+    def puzzle(self):
+        return self._to_lists(self._cells, self._heights)
+
+    @puzzle.setter
+    def puzzle(self, puzzle):
+        self._cells = self._from_lists(puzzle)
+        self._heights = bytearray(len(bottle) for bottle in puzzle)
+        self.refresh_tracking()
+
+    @property
+    def initial_puzzle(self):
+        capacity = self.capacity
+        initial = self._initial
+        heights = [
+            len(initial[index * capacity:index * capacity + capacity].rstrip(b"\x00"))
+            for index in range(self.num_bottles)
+        ]
+        return self._to_lists(initial, heights)
+
+    @initial_puzzle.setter
+    def initial_puzzle(self, puzzle):
+        self._initial = bytes(self._from_lists(puzzle))
+
+    @property
+    def moves_history(self):
+        moves = self._moves
+        return [(moves[i], moves[i + 1]) for i in range(0, len(moves), 2)]
+
+    @moves_history.setter
+    def moves_history(self, moves):
+        self._moves = array("H", [index for move in moves for index in move])
+
+    # The CSV and binary formats only go through the attributes above, so they are shared with 'Game'
+    export_game = Game.export_game
+    import_game = Game.import_game
+    export_record = Game.export_record
+    import_record = Game.import_record
+    load_record = Game.load_record
@@ -1,13 +1,18 @@
 
 import random
-import csv
 import copy
 
 from util.util import print_error, print_debug, print_info
+from util import metrics
 from game.state import GameState
+from game.packed import pack, canonical, unpack
+from game.record import encode_record, decode_record
+from game.gamelog import iter_game_log, write_game_log
+
+metrics.define_histogram("game_move_cells", (1, 2, 3, 4, 6, 8, 12, 16))
 
 class Game:
-    def __init__(self, num_bottles, capacity, num_colors):
+    def __init__(self, num_bottles, capacity, num_colors, puzzle=None, rng=None):
         # Check if input values are valid
         if num_bottles < 1:
             print_error("Number of bottles must be at least 1.")
@@ -32,15 +37,28 @@ class Game:
         self.empty_cells = self.total_cells - self.colored_cells     # Total empty cells
 
         self.moves_history = []    # To keep track of moves for export/import
+        self.undo_stack = []       # (source, destination, cells moved) of each recorded move
+        self.redo_stack = []       # Undone moves, most recent last
+        self.checkpoints = {}      # Checkpoint name -> number of moves
         self.initial_puzzle = []   # To store the initial state of the puzzle
         self.is_game_solved = False  # To mark whether the game was solved
+        self.rng = rng             # Shuffles new puzzles (a 'random.Random'; None uses the module)
 
         self.colors = []           # Color pool
         self.puzzle = []           # Current puzzle state
 
-        self.initialize()
+        # Bookkeeping kept up to date by 'move', see 'refresh_tracking'
+        self.top_colors = []       # Top color of each bottle (0 when empty)
+        self.top_runs = []         # Number of top cells sharing the top color
+        self.free_space = []       # Empty cells left in each bottle
+        self.top_index = {}        # Top color -> indexes of bottles with that top color
+        self.empty_bottles = set() # Indexes of empty bottles
+        self.completed_bottles = 0 # Bottles that are full of a single color
+        self.filled_bottles = 0    # Bottles that are not empty
+
+        self.initialize(puzzle)
 
-    def initialize(self):
+    def initialize(self, puzzle=None):
         # Check total number of cells consistency
         if self.total_cells <= 0:
             print_error("Total number of cells must be positive.")
@@ -65,14 +83,23 @@ class Game:
             self.GAMESTATE = GameState.FAILURE
             return
 
-        # Generate color distribution ensuring each color fits within the bottle capacity
-        self.colors = self.generate_colors()
+        if puzzle is None:
+            # Generate color distribution ensuring each color fits within the bottle capacity
+            self.colors = self.generate_colors()
 
-        # Generate the initial puzzle state
-        self.puzzle = self.generate_puzzle_state()
+            # Generate the initial puzzle state
+            self.puzzle = self.generate_puzzle_state()
+        else:
+            # Start from a given layout (replays, level packs)
+            if len(puzzle) != self.num_bottles or any(len(bottle) > self.capacity for bottle in puzzle):
+                print_error(f"Puzzle does not fit {self.num_bottles} bottles of capacity {self.capacity}.")
+                self.GAMESTATE = GameState.FAILURE
+                return
+            self.puzzle = [list(bottle) for bottle in puzzle]
 
         # Store the initial state of the puzzle
         self.initial_puzzle = copy.deepcopy(self.puzzle)
+        self.refresh_tracking()
 
         self.GAMESTATE = GameState.SUCCESS
 
@@ -85,7 +112,7 @@ class Game:
         for color in range(1, self.num_colors + 1):
             color_pool.extend([color] * self.capacity)
 
-        random.shuffle(color_pool)
+        (self.rng or random).shuffle(color_pool)
         return color_pool
 
     def generate_puzzle_state(self):
@@ -102,59 +129,296 @@ class Game:
 
         return bottles
 
-    def move(self, source, destination) -> bool:
+    def refresh_tracking(self):
+        """
+        Rebuild the per-bottle bookkeeping from 'self.puzzle'.
+        Call this after replacing 'self.puzzle' without going through 'move'.
+        """
+        num_bottles = len(self.puzzle)
+        self.top_colors = [0] * num_bottles
+        self.top_runs = [0] * num_bottles
+        self.free_space = [self.capacity] * num_bottles
+        # One set per color present, so moves never have to create one
+        self.top_index = {color: set() for bottle in self.puzzle for color in bottle}
+        self.empty_bottles = set()
+        self.completed_bottles = 0
+        self.filled_bottles = 0
+        for index in range(num_bottles):
+            self._track_bottle(index)
+
+    def _track_bottle(self, index):
+        bottle = self.puzzle[index]
+        self.free_space[index] = self.capacity - len(bottle)
+        if not bottle:
+            self.top_colors[index] = 0
+            self.top_runs[index] = 0
+            self.empty_bottles.add(index)
+            return
+
+        top_color = bottle[-1]
+        run = 1
+        while run < len(bottle) and bottle[-(run + 1)] == top_color:
+            run += 1
+        self.top_colors[index] = top_color
+        self.top_runs[index] = run
+        self.top_index[top_color].add(index)
+        self.filled_bottles += 1
+        if run == self.capacity:
+            self.completed_bottles += 1
+
+    def move(self, source, destination, record=True) -> bool:
         """
         Move all the same color from the top of 'source' to 'destination'.
         Return True if the move is successful, otherwise False.
+        With 'record' False the move is not added to 'moves_history'.
         """
         # Check if source and destination bottle indexes are valid
         if not (0 <= source < self.num_bottles) or not (0 <= destination < self.num_bottles):
+            if metrics.enabled:
+                metrics.count("game_moves_rejected", reason="bad_index")
             return False  # Invalid bottle index
 
-        source_bottle = self.puzzle[source]
-        dest_bottle = self.puzzle[destination]
-
         # Cannot move from an empty source bottle
-        if not source_bottle:
+        top_colors = self.top_colors
+        top_color = top_colors[source]
+        if not top_color:
+            if metrics.enabled:
+                metrics.count("game_moves_rejected", reason="empty_source")
             return False
 
-        # Top color of the source bottle
-        top_color = source_bottle[-1]
-
         # Destination bottle must be either empty or have the same top color
-        if dest_bottle and dest_bottle[-1] != top_color:
+        dest_color = top_colors[destination]
+        if dest_color and dest_color != top_color:
+            if metrics.enabled:
+                metrics.count("game_moves_rejected", reason="color_mismatch")
             return False
 
-        # Count how many top-color cells can be moved
-        move_count = 0
-        while move_count < len(source_bottle) and source_bottle[-(move_count + 1)] == top_color:
-            move_count += 1
-
-        # Check available space in the destination bottle
-        available_space = self.capacity - len(dest_bottle)
-
-        if move_count > available_space:
+        # Top-color cells that have to move together, and space left in the destination
+        top_runs = self.top_runs
+        move_count = top_runs[source]
+        free_space = self.free_space
+        if move_count > free_space[destination]:
+            if metrics.enabled:
+                metrics.count("game_moves_rejected", reason="no_space")
             return False  # Not enough space in the destination bottle
 
-        # Perform the move
-        dest_bottle.extend(source_bottle[-move_count:])
-        del source_bottle[-move_count:]
+        # Perform the move. Same steps as '_transfer', inlined: the rules above already
+        # fixed the destination's top color and the size of the source's top run.
+        if source != destination:
+            puzzle = self.puzzle
+            top_index = self.top_index
+            source_bottle = puzzle[source]
+            puzzle[destination] += source_bottle[-move_count:]
+            del source_bottle[-move_count:]
+
+            free_space[destination] -= move_count
+            if dest_color:
+                dest_run = top_runs[destination] + move_count
+            else:
+                dest_run = move_count
+                top_colors[destination] = top_color
+                top_index[top_color].add(destination)
+                self.empty_bottles.discard(destination)
+                self.filled_bottles += 1
+            top_runs[destination] = dest_run
+            if dest_run == self.capacity:
+                self.completed_bottles += 1
+                if move_count == dest_run:
+                    self.completed_bottles -= 1  # The source was that full bottle
+
+            free_space[source] += move_count
+            if source_bottle:
+                # The run below is another color: only it has to be scanned
+                new_color = source_bottle[-1]
+                run = 1
+                height = len(source_bottle)
+                while run < height and source_bottle[-1 - run] == new_color:
+                    run += 1
+                top_runs[source] = run
+                top_colors[source] = new_color
+                top_index[top_color].discard(source)
+                top_index[new_color].add(source)
+            else:
+                top_runs[source] = 0
+                top_colors[source] = 0
+                top_index[top_color].discard(source)
+                self.empty_bottles.add(source)
+                self.filled_bottles -= 1
+
+        if metrics.enabled:
+            metrics.count("game_moves_accepted")
+            metrics.observe("game_move_cells", move_count)
 
         # Record the move
+        if record:
+            self.moves_history.append((source, destination))
+            self.undo_stack.append((source, destination, move_count))
+            if self.redo_stack:
+                self._drop_redo()
+        elif source != destination and (self.undo_stack or self.redo_stack):
+            # The stored deltas no longer lead back from this board
+            self.undo_stack = []
+            self.redo_stack = []
+            self.checkpoints = {}
+
+        return True
+
+    def _transfer(self, source, destination, count):
+        # Move 'count' top cells without checking the rules (pouring a bottle into itself changes nothing)
+        if source == destination:
+            return
+        source_bottle = self.puzzle[source]
+        color = source_bottle[-1]
+        self.puzzle[destination].extend(source_bottle[-count:])
+        del source_bottle[-count:]
+
+        # Update the bookkeeping in place: sets only change when a top color does
+        top_colors = self.top_colors
+        top_runs = self.top_runs
+        free_space = self.free_space
+        capacity = self.capacity
+
+        # Destination: the cells land on its top run (an undo can pour onto another color)
+        dest_color = top_colors[destination]
+        if dest_color == color:
+            top_runs[destination] += count
+        else:
+            if dest_color:
+                self.top_index[dest_color].discard(destination)
+            else:
+                self.empty_bottles.discard(destination)
+                self.filled_bottles += 1
+            top_colors[destination] = color
+            top_runs[destination] = count
+            self.top_index[color].add(destination)
+        free_space[destination] -= count
+        if top_runs[destination] == capacity:
+            self.completed_bottles += 1
+
+        # Source: only its new top run has to be scanned
+        if top_runs[source] == capacity:
+            self.completed_bottles -= 1
+        free_space[source] += count
+        if not source_bottle:
+            top_colors[source] = 0
+            top_runs[source] = 0
+            self.top_index[color].discard(source)
+            self.empty_bottles.add(source)
+            self.filled_bottles -= 1
+            return
+        top_color = source_bottle[-1]
+        run = 1
+        height = len(source_bottle)
+        while run < height and source_bottle[-(run + 1)] == top_color:
+            run += 1
+        top_runs[source] = run
+        if top_color != color:
+            top_colors[source] = top_color
+            self.top_index[color].discard(source)
+            self.top_index[top_color].add(source)
+
+    def _drop_redo(self):
+        # A new move replaces the undone ones, and the checkpoints taken among them
+        self.redo_stack = []
+        position = len(self.undo_stack) - 1    # Before the new move
+        self.checkpoints = {name: index for name, index in self.checkpoints.items() if index <= position}
+
+    def reset_history(self):
+        """
+        Forget recorded moves, undo/redo deltas and checkpoints.
+        """
+        self.moves_history = []
+        self.undo_stack = []
+        self.redo_stack = []
+        self.checkpoints = {}
+
+    def undo(self) -> bool:
+        """
+        Take back the last recorded move in O(1) using its stored delta.
+        Return False if there is nothing to undo.
+        """
+        if not self.undo_stack:
+            return False
+        source, destination, count = self.undo_stack.pop()
+        self._transfer(destination, source, count)
+        self.moves_history.pop()
+        self.redo_stack.append((source, destination, count))
+        return True
+
+    def redo(self) -> bool:
+        """
+        Replay the last undone move. Return False if there is nothing to redo.
+        """
+        if not self.redo_stack:
+            return False
+        source, destination, count = self.redo_stack.pop()
+        self._transfer(source, destination, count)
         self.moves_history.append((source, destination))
+        self.undo_stack.append((source, destination, count))
+        return True
+
+    def checkpoint(self, name):
+        """
+        Remember the current move number under 'name' for 'rewind'.
+        """
+        self.checkpoints[name] = len(self.undo_stack)
 
+    def rewind(self, target) -> bool:
+        """
+        Undo or redo moves until the game is at 'target', a checkpoint name or a move
+        number (0 is the oldest undoable position: the initial puzzle, unless a move
+        made with 'record' False cleared the deltas). Return False if it cannot be reached.
+        """
+        index = self.checkpoints.get(target) if isinstance(target, str) else target
+        if index is None or not (0 <= index <= len(self.undo_stack) + len(self.redo_stack)):
+            return False
+        while len(self.undo_stack) > index:
+            self.undo()
+        while len(self.undo_stack) < index:
+            self.redo()
         return True
 
+    def legal_moves(self):
+        """
+        Return every (source, destination) pair that 'move' would accept and that
+        changes the puzzle. Destinations come from the top-color index, so only
+        bottles that can actually receive the pour are visited.
+        """
+        moves = []
+        free_space = self.free_space
+        top_runs = self.top_runs
+        for source, top_color in enumerate(self.top_colors):
+            if not top_color:
+                continue
+            run = top_runs[source]
+            for destination in self.top_index[top_color]:
+                if destination != source and free_space[destination] >= run:
+                    moves.append((source, destination))
+            for destination in self.empty_bottles:
+                moves.append((source, destination))
+        return moves
+
     def is_solved(self):
         """
         Check if the game is solved: all bottles should either be empty or filled with one color.
         """
-        for bottle in self.puzzle:
-            if not bottle:
-                continue  # Ignore empty bottles
-            if len(bottle) != self.capacity or len(set(bottle)) != 1:
-                return False  # Bottle must be full and contain only one color
-        return True
+        return self.completed_bottles == self.filled_bottles
+
+    def state_key(self, canonical_order=True):
+        """
+        Return the current puzzle as immutable packed bytes, usable as a dict/set key.
+        With 'canonical_order' the bottles are sorted so permuted layouts share one key.
+        """
+        if canonical_order:
+            return canonical(self.puzzle, self.capacity)
+        return pack(self.puzzle, self.capacity)
+
+    def load_state_key(self, key):
+        """
+        Replace the current puzzle with the one stored in a key from 'state_key'.
+        """
+        self.puzzle = unpack(key, self.capacity)
+        self.refresh_tracking()
 
     def export_game(self, filename):
         """
@@ -162,64 +426,82 @@ class Game:
         """
         try:
             with open(filename, 'w', newline='') as csvfile:
-                writer = csv.writer(csvfile)
-                # Write initial puzzle state
-                writer.writerow(['Initial Puzzle State'])
-                for bottle in self.initial_puzzle:
-                    writer.writerow(bottle)
-                writer.writerow([])  # Empty line
-
-                # Write moves history
-                writer.writerow(['Moves History'])
-                writer.writerow(['source', 'destination'])
-                for move in self.moves_history:
-                    writer.writerow([move[0], move[1]])
-                writer.writerow([])  # Empty line
-
-                # Write final status
-                writer.writerow(['Game Solved', self.is_game_solved])
+                write_game_log(csvfile, self.initial_puzzle, self.moves_history, self.is_game_solved)
             print_info(f"Game exported successfully to {filename}.")
         except Exception as e:
             print_error(f"Failed to export game: {e}")
 
-    def import_game(self, filename):
+    def import_game(self, filename, verify_only=False):
         """
         Import game data from a CSV file and replay the game.
+        The log is streamed: moves are replayed as they are read. With 'verify_only' the
+        moves are checked but not kept in 'moves_history', so memory stays constant.
+        Returns False on the first invalid move, reporting its line number.
         """
         try:
-            with open(filename, 'r') as csvfile:
-                reader = csv.reader(csvfile)
-                content = list(reader)
-
-                # Extract initial puzzle state
-                initial_state_index = content.index(['Initial Puzzle State']) + 1
-                moves_history_index = content.index(['Moves History'])
-                initial_puzzle_data = content[initial_state_index:moves_history_index - 1]
-
-                # Reconstruct the initial puzzle state
-                self.initial_puzzle = [list(map(int, row)) for row in initial_puzzle_data]
-                self.puzzle = copy.deepcopy(self.initial_puzzle)
-
+            with open(filename, 'r', newline='') as csvfile:
                 # Reset moves history
-                self.moves_history = []
-
-                # Extract moves history
-                moves_data = content[moves_history_index + 2:]  # Skip 'Moves History' and headers
-                for row in moves_data:
-                    if not row:
-                        continue
-                    if row[0] == 'Game Solved':
+                self.reset_history()
+
+                for kind, value, line in iter_game_log(csvfile):
+                    if kind == 'move':
+                        source, destination = value
+                        if not self.move(source, destination, record=not verify_only):
+                            print_error(f"Invalid move from {source + 1} to {destination + 1} on line {line}.")
+                            return False
+                    elif kind == 'initial':
+                        # Reconstruct the initial puzzle state
+                        self.initial_puzzle = value
+                        self.puzzle = [list(bottle) for bottle in value]
+                        self.refresh_tracking()
+                    elif kind == 'solved':
                         # Read final status
-                        self.is_game_solved = row[1] == 'True'
-                        break
-                    source = int(row[0])
-                    destination = int(row[1])
-                    if not self.move(source, destination):
-                        print_error(f"Invalid move from {source + 1} to {destination + 1}.")
-                        break
+                        self.is_game_solved = value
 
                 print_info("Game replayed successfully.")
                 return True
         except Exception as e:
             print_error(f"Failed to import game: {e}")
             return False
+
+    def export_record(self, filename):
+        """
+        Export the game to a compact binary record (see 'game.record').
+        """
+        try:
+            with open(filename, 'wb') as record_file:
+                record_file.write(encode_record(self.initial_puzzle, self.moves_history, self.capacity, self.is_game_solved))
+            print_info(f"Game exported successfully to {filename}.")
+        except Exception as e:
+            print_error(f"Failed to export game: {e}")
+
+    def import_record(self, filename):
+        """
+        Import a binary record written by 'export_record' and replay the game.
+        """
+        try:
+            with open(filename, 'rb') as record_file:
+                record = decode_record(record_file.read())
+            return self.load_record(record)
+        except Exception as e:
+            print_error(f"Failed to import game: {e}")
+            return False
+
+    def load_record(self, record):
+        """
+        Replay a 'game.record.GameRecord' (for example one read from a 'GameArchive').
+        """
+        if record.capacity != self.capacity or record.num_bottles != self.num_bottles:
+            print_error(f"Record is for {record.num_bottles} bottles of {record.capacity}, not {self.num_bottles} of {self.capacity}.")
+            return False
+
+        self.initial_puzzle = record.initial_puzzle
+        self.puzzle = copy.deepcopy(self.initial_puzzle)
+        self.refresh_tracking()
+        self.reset_history()
+        self.is_game_solved = record.is_game_solved
+        for source, destination in record.moves_history:
+            if not self.move(source, destination):
+                print_error(f"Invalid move from {source + 1} to {destination + 1}.")
+                return False
+        return True
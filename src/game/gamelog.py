@@ -0,0 +1,77 @@
+import csv
+
+
+def iter_game_log(csvfile):
+    """
+    Stream a CSV game log written by 'Game.export_game', one row at a time.
+
+    Yields (kind, value, line number) tuples:
+      ('initial', initial puzzle, line) once, when the 'Moves History' section starts,
+      ('move', (source, destination), line) for every recorded move,
+      ('solved', bool, line) for the final status.
+    Only the initial puzzle is kept in memory, so logs of any length are read in
+    constant memory. Raises ValueError with the line number on malformed input.
+    """
+    reader = csv.reader(csvfile)
+    section = None
+    bottles = []
+    blank_rows = 0  # Empty bottles are written as blank rows, the last one is a separator
+
+    for row in reader:
+        line = reader.line_num
+        if section is None:
+            if row == ['Initial Puzzle State']:
+                section = 'initial'
+            elif row:
+                raise ValueError(f"Expected 'Initial Puzzle State' on line {line}")
+        elif section == 'initial':
+            if row == ['Moves History']:
+                bottles.extend([] for _ in range(blank_rows - 1))
+                section = 'header'
+                yield 'initial', bottles, line
+            elif not row:
+                blank_rows += 1
+            else:
+                bottles.extend([] for _ in range(blank_rows))
+                blank_rows = 0
+                try:
+                    bottles.append([int(cell) for cell in row])
+                except ValueError:
+                    raise ValueError(f"Invalid bottle on line {line}: {row}")
+        elif section == 'header':
+            section = 'moves'  # Skip the 'source, destination' header row
+        elif section == 'moves':
+            if not row:
+                continue
+            if row[0] == 'Game Solved':
+                yield 'solved', len(row) > 1 and row[1] == 'True', line
+                return
+            try:
+                yield 'move', (int(row[0]), int(row[1])), line
+            except (ValueError, IndexError):
+                raise ValueError(f"Invalid move on line {line}: {row}")
+
+    if section in (None, 'initial'):
+        raise ValueError("Missing 'Moves History' section")
+
+
+def write_game_log(csvfile, initial_puzzle, moves_history, is_game_solved):
+    """
+    Write a CSV game log in the format 'Game.export_game' uses and 'iter_game_log' reads.
+    """
+    writer = csv.writer(csvfile)
+    # Write initial puzzle state
+    writer.writerow(['Initial Puzzle State'])
+    for bottle in initial_puzzle:
+        writer.writerow(bottle)
+    writer.writerow([])  # Empty line
+
+    # Write moves history
+    writer.writerow(['Moves History'])
+    writer.writerow(['source', 'destination'])
+    for move in moves_history:
+        writer.writerow([move[0], move[1]])
+    writer.writerow([])  # Empty line
+
+    # Write final status
+    writer.writerow(['Game Solved', is_game_solved])
@@ -0,0 +1,172 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from solver.astar import AStarSolver
+from util.util import print_error
+
+CHUNK_SIZE = 4096  # Puzzles per seeded chunk, independent of the number of workers
+
+
+def shuffled_puzzles(rng, count, num_bottles, capacity, num_colors):
+    """
+    Draw 'count' puzzles the way 'Game.generate_puzzle_state' does (shuffle the color
+    pool, fill bottles in order), vectorized. Returns int8 arrays
+    cells (count, num_bottles, capacity) and heights (count, num_bottles).
+    """
+    num_cells = num_colors * capacity
+    pool = np.repeat(np.arange(1, num_colors + 1, dtype=np.int8), capacity)
+    order = np.argsort(rng.random((count, num_cells)), axis=1)
+
+    flat = np.zeros((count, num_bottles * capacity), dtype=np.int8)
+    flat[:, :num_cells] = pool[order]
+    cells = flat.reshape(count, num_bottles, capacity)
+
+    filled = num_cells - np.arange(num_bottles) * capacity
+    heights = np.clip(filled, 0, capacity).astype(np.int8)
+    return cells, np.broadcast_to(heights, (count, num_bottles)).copy()
+
+
+def canonical_keys(cells):
+    """
+    Canonical keys (see 'game.packed.canonical') of a batch of puzzles: bottles are
+    sorted as byte strings, then each puzzle is turned into bytes.
+    """
+    count, num_bottles, capacity = cells.shape
+    bottles = np.ascontiguousarray(cells).view(np.uint8).view(f"V{capacity}").reshape(count, num_bottles)
+    ordered = np.sort(bottles, axis=1)
+    return [row.tobytes() for row in ordered]
+
+
+def to_puzzles(cells, heights):
+    """
+    Convert batched arrays into a list of 'Game.puzzle' (list of lists).
+    """
+    puzzles = []
+    for puzzle_cells, puzzle_heights in zip(cells.tolist(), heights.tolist()):
+        puzzles.append([bottle[:height] for bottle, height in zip(puzzle_cells, puzzle_heights)])
+    return puzzles
+
+
+def _is_solved(cells, heights, capacity):
+    uniform = (cells == cells[:, :, :1]).all(axis=2)
+    return ((heights == 0) | ((heights == capacity) & uniform)).all(axis=1)
+
+
+def _generate_chunk(task):
+    """
+    Generate and filter one seeded chunk. Runs in worker processes.
+    Returns (keys of every puzzle drawn, then keys, puzzles and solution lengths of
+    the puzzles kept) in generation order.
+    """
+    (entropy, chunk_index, chunk_size, num_bottles, capacity, num_colors,
+     unique, reject_trivial, check_solvable, min_moves, solver_options) = task
+    rng = np.random.default_rng(np.random.SeedSequence(entropy, spawn_key=(chunk_index,)))
+    cells, heights = shuffled_puzzles(rng, chunk_size, num_bottles, capacity, num_colors)
+
+    keep = np.ones(chunk_size, dtype=bool)
+    if reject_trivial:
+        keep &= ~_is_solved(cells, heights, capacity)
+
+    keys = canonical_keys(cells)
+    drawn = set(keys)
+    if unique:
+        seen = set()
+        for index, key in enumerate(keys):
+            if key in seen:
+                keep[index] = False
+            seen.add(key)
+
+    indexes = np.flatnonzero(keep)
+    puzzles = to_puzzles(cells[indexes], heights[indexes])
+    keys = [keys[index] for index in indexes]
+    lengths = [None] * len(puzzles)
+
+    if check_solvable:
+        solver = AStarSolver(capacity, **solver_options)
+        kept_keys, kept_puzzles, kept_lengths = [], [], []
+        for key, puzzle in zip(keys, puzzles):
+            solution = solver.solve(puzzle)
+            if solution is None or len(solution) < min_moves:
+                continue  # Unsolvable, too easy, or out of budget
+            kept_keys.append(key)
+            kept_puzzles.append(puzzle)
+            kept_lengths.append(len(solution))
+        return drawn, kept_keys, kept_puzzles, kept_lengths
+
+    return drawn, keys, puzzles, lengths
+
+
+def generate_puzzles(num_bottles, capacity, num_colors, count, seed=None, unique=True,
+                     reject_trivial=True, check_solvable=False, min_moves=1,
+                     solver_options=None, workers=1, chunk_size=CHUNK_SIZE):
+    """
+    Generate 'count' puzzles in bulk.
+
+    The same 'seed' (and 'chunk_size') always gives the same puzzles, whatever 'workers'
+    is: work is split into chunks, each seeded from (seed, chunk index), and results are
+    merged in chunk order. With 'unique', puzzles equal up to bottle order are dropped,
+    and generation stops early, with a warning and fewer puzzles, at the first chunk
+    that draws no puzzle seen before (no more distinct puzzles). Without it, duplicates
+    fill up 'count'; generation only stops early when the filters reject every puzzle
+    the configuration has. With
+    'check_solvable', every puzzle goes through the A* solver and is kept only if a
+    solution of at least 'min_moves' pours is found within 'solver_options' budget.
+
+    Returns (puzzles, solution lengths); lengths are None without 'check_solvable'.
+    """
+    if num_bottles <= num_colors:
+        raise ValueError("Number of bottles must be greater than number of colors.")
+    if capacity < 1 or num_colors < 1:
+        raise ValueError("Capacity and number of colors must be at least 1.")
+    if num_colors > 127:
+        raise ValueError("Number of colors must be at most 127.")
+
+    entropy = np.random.SeedSequence(seed).entropy
+    solver_options = dict(solver_options or {"max_nodes": 200_000})
+
+    def tasks():
+        chunk_index = 0
+        while True:
+            yield (entropy, chunk_index, chunk_size, num_bottles, capacity, num_colors,
+                   unique, reject_trivial, check_solvable, min_moves, solver_options)
+            chunk_index += 1
+
+    puzzles, lengths = [], []
+    seen = set()    # Keys of every puzzle drawn so far, kept or filtered out
+
+    def collect(results):
+        """
+        Merge chunk results in order. Returns True once generation should stop.
+        """
+        for drawn, keys, chunk_puzzles, chunk_lengths in results:
+            fresh = drawn - seen
+            if not fresh and (unique or not keys):
+                # Exhausted: every puzzle drawn was seen before and, when duplicates are
+                # allowed, the filters reject all of them
+                return True
+            seen.update(fresh)
+            for key, puzzle, length in zip(keys, chunk_puzzles, chunk_lengths):
+                if unique and key not in fresh:
+                    continue  # Drawn by an earlier chunk
+                puzzles.append(puzzle)
+                lengths.append(length)
+                if len(puzzles) == count:
+                    return True
+        return False
+
+    done = count <= 0
+    if workers <= 1:
+        if not done:
+            collect(map(_generate_chunk, tasks()))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            task_iter = tasks()
+            while not done:
+                wave = [next(task_iter) for _ in range(workers)]
+                done = collect(executor.map(_generate_chunk, wave))
+
+    if len(puzzles) < count:
+        print_error(f"Only {len(puzzles)} of {count} puzzles generated: "
+                    f"{num_bottles}/{capacity}/{num_colors} has no more puzzles that pass the filters.")
+    return puzzles, lengths
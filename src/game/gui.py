@@ -1,9 +1,13 @@
 import pygame
 import random
 import sys
+import time
 
 from util.util import print_error, print_debug, print_info
+from util import metrics
 from game.game import Game
+from game.hint import HintWorker, DeadlockWorker
+from solver.deadlock import DeadlockDetector
 
 
 class GameGUI:
@@ -34,6 +38,35 @@ class GameGUI:
         self.bottle_outline_color = (200, 200, 200)
         self.bottle_fill_color = (50, 50, 50)
         self.selected_bottle_color = (255, 215, 0)  # Gold highlight
+        self.hint_bottle_color = (0, 200, 255)      # Cyan highlight
+
+        # Hints and auto-solve ('H' and 'A' keys), computed by a background worker
+        self.hint_worker = None      # Started on first use
+        self.hint_pending = False    # A hint was requested and is not back yet
+        self.hint_move = None        # (source, destination) to highlight
+        self.auto_solve = False
+        self.auto_move_delay = 300   # Milliseconds between auto-solve pours
+        self.last_auto_move = 0
+
+        # "No solution left" banner, checked once after every change of the board: the
+        # quick tier runs in the frame, the bounded search on a background worker
+        self.deadlock_detector = DeadlockDetector(self.game.capacity)
+        self.deadlock_worker = None      # Started on first use
+        self.deadlock_pending = True     # The board changed since the last check
+        self.deadlock_searching = False  # A search was requested and is not back yet
+        self.stuck = False               # The current board is proven unsolvable
+        self.banner_dirty = False        # The banner has to be redrawn
+
+        # Frame rates: full speed while something changes, idle otherwise
+        self.active_fps = 60
+        self.idle_fps = 10
+
+        # Rendering caches, see 'compute_layout' and 'draw_puzzle'
+        self.bottle_rects = []       # Screen rect of each bottle
+        self.bottle_surfaces = {}    # (bottle contents, selected) -> pre-rendered surface
+        self.dirty_bottles = set()   # Bottles to redraw on the next frame
+        self.full_redraw = True      # Redraw the whole screen on the next frame
+        self.compute_layout()
 
     def assign_random_colors(self):
         """
@@ -48,12 +81,11 @@ class GameGUI:
             color.hsva = (hue, 80, 90, 100)
             self.color_map[color_num] = color
 
-    def draw_puzzle(self):
+    def compute_layout(self):
         """
-        Draw the current puzzle state using Pygame.
+        Compute bottle positions and sizes for the current screen size.
+        Called once at start and on every resize; drawing and clicks reuse the result.
         """
-        self.screen.fill(self.background_color)  # Dark background
-
         # Responsive bottle size
         bottle_spacing = 20
         max_bottle_width = 80
@@ -62,100 +94,331 @@ class GameGUI:
         capacity = self.game.capacity
 
         # Determine number of rows for bottles (responsive layout)
-        bottles_per_row = min(num_bottles, self.screen_width // (max_bottle_width + bottle_spacing))
+        bottles_per_row = max(1, min(num_bottles, self.screen_width // (max_bottle_width + bottle_spacing)))
         num_rows = (num_bottles + bottles_per_row - 1) // bottles_per_row
 
         bottle_width = min(max_bottle_width, (self.screen_width - (bottles_per_row + 1) * bottle_spacing) / bottles_per_row)
         bottle_height = min(max_bottle_height, (self.screen_height - 200) / num_rows)  # Reserve space for header and footer
-        liquid_height = (bottle_height - 20) / capacity
+        self.bottle_width = bottle_width
+        self.bottle_height = bottle_height
+        self.liquid_height = (bottle_height - 20) / capacity
 
         start_x = (self.screen_width - (bottles_per_row * (bottle_width + bottle_spacing) - bottle_spacing)) / 2
         start_y = (self.screen_height - (num_rows * (bottle_height + bottle_spacing) - bottle_spacing)) / 2 + 30
 
-        for index, bottle in enumerate(self.game.puzzle):
+        self.bottle_rects = []
+        for index in range(num_bottles):
             row = index // bottles_per_row
             col = index % bottles_per_row
             x = start_x + col * (bottle_width + bottle_spacing)
             y = start_y + row * (bottle_height + bottle_spacing)
+            self.bottle_rects.append(pygame.Rect(x, y, bottle_width, bottle_height))
 
-            # Draw bottle outline
-            pygame.draw.rect(self.screen, self.bottle_fill_color, (x, y, bottle_width, bottle_height), border_radius=10)
-            pygame.draw.rect(self.screen, self.bottle_outline_color, (x, y, bottle_width, bottle_height), 2, border_radius=10)
-
-            # Highlight selected bottle
-            if self.selected_bottle == index:
-                pygame.draw.rect(self.screen, self.selected_bottle_color, (x - 3, y - 3, bottle_width + 6, bottle_height + 6), 3, border_radius=13)
-
-            # Draw liquids from bottom to top with spacing between layers
-            num_liquids = len(bottle)
-            for i in range(num_liquids):
-                color_num = bottle[i]  # Access from first element
-                color = self.color_map.get(color_num, (255, 255, 255))
-                rect = pygame.Rect(
-                    x + 5,
-                    y + bottle_height - 10 - (i + 1) * liquid_height + 5,  # Add spacing between layers
-                    bottle_width - 10,
-                    liquid_height - 5  # Reduce height slightly for spacing
-                )
-                pygame.draw.rect(self.screen, color, rect, border_radius=3)
+        # Undo / Redo buttons in the footer
+        button_y = self.screen_height - 60
+        self.undo_button = pygame.Rect(self.screen_width // 2 - 110, button_y, 100, 40)
+        self.redo_button = pygame.Rect(self.screen_width // 2 + 10, button_y, 100, 40)
 
-        pygame.display.flip()
+        # Banner in the header
+        self.banner_rect = pygame.Rect(0, 10, self.screen_width, 40)
 
-    def get_bottle_at_pos(self, pos):
+        # Cached surfaces have the old size
+        self.bottle_surfaces = {}
+        self.full_redraw = True
+
+    def render_bottle(self, bottle, highlight_color=None):
         """
-        Determine which bottle was clicked based on the mouse position.
+        Return a surface with one bottle, its liquids and an optional highlight.
+        Surfaces are cached by contents, so unchanged bottles are never drawn twice.
         """
-        bottle_spacing = 20
-        bottles_per_row = min(self.game.num_bottles, self.screen_width // (80 + bottle_spacing))
-        num_rows = (self.game.num_bottles + bottles_per_row - 1) // bottles_per_row
+        cache_key = (tuple(bottle), highlight_color)
+        surface = self.bottle_surfaces.get(cache_key)
+        if surface is not None:
+            return surface
+
+        bottle_width = self.bottle_width
+        bottle_height = self.bottle_height
+        liquid_height = self.liquid_height
+        surface = pygame.Surface((int(bottle_width) + 6, int(bottle_height) + 6), pygame.SRCALPHA)
+        x, y = 3, 3
+
+        # Draw bottle outline
+        pygame.draw.rect(surface, self.bottle_fill_color, (x, y, bottle_width, bottle_height), border_radius=10)
+        pygame.draw.rect(surface, self.bottle_outline_color, (x, y, bottle_width, bottle_height), 2, border_radius=10)
+
+        # Highlight selected or hinted bottle
+        if highlight_color is not None:
+            pygame.draw.rect(surface, highlight_color, (x - 3, y - 3, bottle_width + 6, bottle_height + 6), 3, border_radius=13)
+
+        # Draw liquids from bottom to top with spacing between layers
+        for i, color_num in enumerate(bottle):
+            color = self.color_map.get(color_num, (255, 255, 255))
+            rect = pygame.Rect(
+                x + 5,
+                y + bottle_height - 10 - (i + 1) * liquid_height + 5,  # Add spacing between layers
+                bottle_width - 10,
+                liquid_height - 5  # Reduce height slightly for spacing
+            )
+            pygame.draw.rect(surface, color, rect, border_radius=3)
+
+        # Contents seen during one game are few, but keep the cache bounded anyway
+        if len(self.bottle_surfaces) > 512:
+            self.bottle_surfaces.clear()
+        self.bottle_surfaces[cache_key] = surface
+        return surface
+
+    def mark_dirty(self, *indexes):
+        """
+        Schedule bottles for redraw on the next frame.
+        """
+        for index in indexes:
+            if index is not None:
+                self.dirty_bottles.add(index)
 
-        bottle_width = min(80, (self.screen_width - (bottles_per_row + 1) * bottle_spacing) / bottles_per_row)
-        bottle_height = min(300, (self.screen_height - 200) / num_rows)
-        start_x = (self.screen_width - (bottles_per_row * (bottle_width + bottle_spacing) - bottle_spacing)) / 2
-        start_y = (self.screen_height - (num_rows * (bottle_height + bottle_spacing) - bottle_spacing)) / 2 + 30
+    def draw_puzzle(self):
+        """
+        Draw the current puzzle state using Pygame.
+        Only bottles marked dirty are redrawn and pushed to the display, unless a full
+        redraw is pending (start, resize, after a dialog).
+        """
+        if self.full_redraw:
+            self.screen.fill(self.background_color)  # Dark background
+            self.draw_button(self.undo_button, "Undo")
+            self.draw_button(self.redo_button, "Redo")
+            indexes = range(self.game.num_bottles)
+        elif self.dirty_bottles or self.banner_dirty:
+            indexes = sorted(self.dirty_bottles)
+        else:
+            return  # Nothing changed
+
+        updated = []
+        for index in indexes:
+            bottle_rect = self.bottle_rects[index]
+            area = bottle_rect.inflate(6, 6)
+            if not self.full_redraw:
+                self.screen.fill(self.background_color, area)
+            surface = self.render_bottle(self.game.puzzle[index], self.get_highlight(index))
+            self.screen.blit(surface, area.topleft)
+            updated.append(area)
+
+        if self.full_redraw or self.banner_dirty:
+            self.draw_banner()
+            updated.append(self.banner_rect)
+
+        if metrics.enabled:
+            display_start = time.perf_counter()
+        if self.full_redraw:
+            pygame.display.flip()
+        else:
+            pygame.display.update(updated)
+        if metrics.enabled:
+            metrics.observe("gui_frame_seconds", time.perf_counter() - display_start, phase="display")
+        self.full_redraw = False
+        self.dirty_bottles.clear()
+
+    def draw_banner(self):
+        self.screen.fill(self.background_color, self.banner_rect)
+        if self.stuck:
+            text = self.font_large.render("No solution left", True, (255, 90, 90))
+            self.screen.blit(text, text.get_rect(center=self.banner_rect.center))
+        self.banner_dirty = False
+
+    def update_deadlock(self):
+        """
+        Check the board for a deadlock after it changed. Only the quick tier runs in the
+        frame; otherwise the bounded search goes to the background worker and its
+        verdict is picked up by a later frame. An undecided board shows no banner.
+        """
+        if self.deadlock_pending:
+            self.deadlock_pending = False
+            self.deadlock_searching = False
+            stuck = False
+            if not self.game.is_solved():
+                stuck = self.deadlock_detector.quick_check(self.game.puzzle)
+                if not stuck:
+                    if self.deadlock_worker is None:
+                        self.deadlock_worker = DeadlockWorker(self.game.capacity, max_nodes=2000)
+                    self.deadlock_worker.request(self.game.puzzle)
+                    self.deadlock_searching = True
+            self.set_stuck(stuck)
+        elif self.deadlock_searching:
+            result = self.deadlock_worker.poll()
+            if result is not None:
+                self.deadlock_searching = False
+                self.set_stuck(result[1] is True)
+
+    def set_stuck(self, stuck):
+        if stuck != self.stuck:
+            self.stuck = stuck
+            self.banner_dirty = True
+
+    def get_highlight(self, index):
+        if self.selected_bottle == index:
+            return self.selected_bottle_color
+        if self.hint_move is not None and index in self.hint_move:
+            return self.hint_bottle_color
+        return None
 
-        x, y = pos
-        for index in range(self.game.num_bottles):
-            row = index // bottles_per_row
-            col = index % bottles_per_row
-            bottle_x = start_x + col * (bottle_width + bottle_spacing)
-            bottle_y = start_y + row * (bottle_height + bottle_spacing)
-            bottle_rect = pygame.Rect(bottle_x, bottle_y, bottle_width, bottle_height)
-            if bottle_rect.collidepoint(x, y):
+    def request_hint(self):
+        """
+        Ask the background worker for the best next move of the current puzzle.
+        """
+        if self.hint_worker is None:
+            self.hint_worker = HintWorker(self.game.capacity)
+        self.hint_worker.request(self.game.puzzle)
+        self.hint_pending = True
+
+    def clear_hint(self):
+        if self.hint_move is not None:
+            self.mark_dirty(*self.hint_move)
+        self.hint_move = None
+        if self.hint_worker is not None:
+            self.hint_worker.cancel()
+        self.hint_pending = False
+
+    def update_hint(self):
+        """
+        Pick up finished hints and play auto-solve moves. Never blocks the frame.
+        """
+        if self.hint_pending:
+            result = self.hint_worker.poll()
+            if result is not None:
+                self.hint_pending = False
+                _, solution = result
+                if solution:
+                    self.hint_move = solution[0]
+                    self.mark_dirty(*self.hint_move)
+                elif solution is None:
+                    print_info("No solution found from this state.")
+                    self.auto_solve = False
+
+        if self.auto_solve and self.hint_move is not None:
+            now = pygame.time.get_ticks()
+            if now - self.last_auto_move >= self.auto_move_delay:
+                self.last_auto_move = now
+                source, destination = self.hint_move
+                self.clear_hint()
+                self.play_move(source, destination)
+                self.request_hint()
+
+    def play_move(self, source, destination):
+        self.mark_dirty(source, destination)
+        if self.game.move(source, destination):
+            print_info(f"Moved from bottle {source + 1} to bottle {destination + 1}.")
+            self.deadlock_pending = True
+            return True
+        print_info("Invalid move.")
+        return False
+
+    def step_history(self, forward):
+        """
+        Undo (or redo) one move and redraw the two bottles it touched.
+        """
+        history = self.game.redo_stack if forward else self.game.undo_stack
+        if not history:
+            return
+        source, destination, _ = history[-1]
+        self.auto_solve = False
+        self.clear_hint()
+        self.mark_dirty(self.selected_bottle, source, destination)
+        self.selected_bottle = None
+        if forward:
+            self.game.redo()
+        else:
+            self.game.undo()
+        self.deadlock_pending = True
+
+    def handle_key(self, key):
+        ctrl = pygame.key.get_mods() & (pygame.KMOD_CTRL | pygame.KMOD_META)
+        if ctrl and key == pygame.K_z:
+            self.step_history(forward=False)
+        elif ctrl and key == pygame.K_y:
+            self.step_history(forward=True)
+        elif key == pygame.K_h:
+            self.auto_solve = False
+            self.request_hint()
+        elif key == pygame.K_a:
+            self.auto_solve = not self.auto_solve
+            if self.auto_solve:
+                self.request_hint()
+            else:
+                self.clear_hint()
+
+    def get_bottle_at_pos(self, pos):
+        """
+        Determine which bottle was clicked based on the mouse position.
+        """
+        for index, bottle_rect in enumerate(self.bottle_rects):
+            if bottle_rect.collidepoint(pos):
                 return index
         return None
 
     def start(self):
+        active = True
         while self.running:
-            self.clock.tick(60)  # Limit to 60 FPS
-            for event in pygame.event.get():
+            # Limit to 60 FPS while the player interacts, drop to the idle rate otherwise
+            self.clock.tick(self.active_fps if active else self.idle_fps)
+            if metrics.enabled:
+                frame_start = time.perf_counter()
+            events = pygame.event.get()
+            active = bool(events) or self.full_redraw or bool(self.dirty_bottles) or self.hint_pending or self.auto_solve \
+                or self.banner_dirty or self.deadlock_searching
+            for event in events:
                 if event.type == pygame.QUIT:
                     self.handle_quit()
                 elif event.type == pygame.VIDEORESIZE:
                     self.screen_width, self.screen_height = event.size
                     self.screen = pygame.display.set_mode((self.screen_width, self.screen_height), pygame.RESIZABLE)
+                    self.compute_layout()
+                elif event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                    self.full_redraw = True
                 elif event.type == pygame.MOUSEBUTTONDOWN:
                     self.handle_click(event.pos)
-
+                elif event.type == pygame.KEYDOWN:
+                    self.handle_key(event.key)
+
+            self.update_hint()
+            self.update_deadlock()
+            if metrics.enabled:
+                draw_start = time.perf_counter()
+                metrics.observe("gui_frame_seconds", draw_start - frame_start, phase="events")
             self.draw_puzzle()
+            if metrics.enabled:
+                solved_start = time.perf_counter()
+                # Includes the 'display' phase observed inside 'draw_puzzle'
+                metrics.observe("gui_frame_seconds", solved_start - draw_start, phase="draw")
+
+            solved = self.game.is_solved()
+            if metrics.enabled:
+                metrics.observe("gui_frame_seconds", time.perf_counter() - solved_start, phase="is_solved")
+                metrics.count("gui_frames", active=active)
 
-            if self.game.is_solved():
+            if solved:
                 self.game.is_game_solved = True
                 self.display_win_message()
                 pygame.time.delay(2000)
                 self.handle_quit()
 
     def handle_click(self, pos):
+        if self.undo_button.collidepoint(pos):
+            self.step_history(forward=False)
+            return
+        if self.redo_button.collidepoint(pos):
+            self.step_history(forward=True)
+            return
+
         bottle_index = self.get_bottle_at_pos(pos)
         if bottle_index is not None:
+            # Both the selection highlight and a pour only touch these two bottles
+            self.mark_dirty(self.selected_bottle, bottle_index)
             if self.selected_bottle is None:
                 self.selected_bottle = bottle_index
             else:
                 if self.selected_bottle != bottle_index:
-                    if self.game.move(self.selected_bottle, bottle_index):
-                        print_info(f"Moved from bottle {self.selected_bottle + 1} to bottle {bottle_index + 1}.")
-                    else:
-                        print_info("Invalid move.")
+                    # A player move makes the current hint (and running search) stale
+                    self.auto_solve = False
+                    self.clear_hint()
+                    self.play_move(self.selected_bottle, bottle_index)
                 self.selected_bottle = None
 
     def display_win_message(self):
@@ -167,6 +430,11 @@ class GameGUI:
 
     def handle_quit(self):
         # Ask if the player wants to export the game using GUI
+        self.full_redraw = True  # Dialogs draw over the board
+        if self.hint_worker is not None:
+            self.hint_worker.close()
+        if self.deadlock_worker is not None:
+            self.deadlock_worker.close()
         export = self.show_export_dialog()
         if export:
             filename = self.show_filename_input()
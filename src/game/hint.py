@@ -0,0 +1,153 @@
+import queue
+import threading
+
+from game.packed import pack
+from solver.deadlock import DeadlockDetector
+from solver.idastar import IDAStarSolver
+from solver.moves import to_state
+from solver.table import TranspositionTable
+
+
+class HintWorker:
+    """
+    Runs the solver on a background thread so the GUI frame loop never waits for it.
+
+    'request' hands over a snapshot of the puzzle and cancels any search still running
+    for an older one; 'poll' returns finished results without blocking. Solutions are
+    cached per exact layout, including every state along the solution, so following a
+    hint and asking again is answered from the cache.
+    """
+    def __init__(self, capacity, time_limit=10, table_bytes=64 * 1024 * 1024):
+        self.capacity = capacity
+        self.time_limit = time_limit
+        self.table_bytes = table_bytes
+        self.table = None               # Created lazily, the key size depends on the board
+        self.cache = {}                 # Packed layout -> remaining solution (or None)
+
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        self._stop_event = threading.Event()
+        self._generation = 0
+        self._thread = threading.Thread(target=self._run, name="hint-worker", daemon=True)
+        self._thread.start()
+
+    def request(self, puzzle):
+        """
+        Ask for the solution of 'puzzle'. Returns a request id that 'poll' results carry.
+        A cached layout is answered right away, without touching the worker thread.
+        """
+        self.cancel()
+        self._generation += 1
+        key = pack(puzzle, self.capacity)
+        if key in self.cache:
+            self._results.put((self._generation, self.cache[key]))
+        else:
+            self._stop_event = threading.Event()
+            self._requests.put((self._generation, [list(bottle) for bottle in puzzle], self._stop_event))
+        return self._generation
+
+    def cancel(self):
+        """
+        Stop the running search, if any. Its result is dropped.
+        """
+        self._stop_event.set()
+
+    def poll(self):
+        """
+        Return (request id, solution) for the latest request once it is done, or None.
+        'solution' is a list of (source, destination) moves, or None if not found.
+        Results of superseded requests are discarded.
+        """
+        while True:
+            try:
+                generation, solution = self._results.get_nowait()
+            except queue.Empty:
+                return None
+            if generation == self._generation:
+                return generation, solution
+
+    def close(self):
+        self.cancel()
+        self._requests.put(None)
+
+    def _run(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            generation, puzzle, stop_event = item
+            if stop_event.is_set():
+                continue  # Superseded before it started
+
+            if self.table is None:
+                self.table = TranspositionTable(len(puzzle) * self.capacity, max_bytes=self.table_bytes)
+            solver = IDAStarSolver(self.capacity, time_limit=self.time_limit, table=self.table,
+                                   stop_event=stop_event)
+            solution = solver.solve(puzzle)
+            if solver.status == "cancelled":
+                continue
+            if solution is not None:
+                self._cache_path(puzzle, solution)
+            elif solver.status == "unsolvable":
+                self.cache[pack(puzzle, self.capacity)] = None
+            self._results.put((generation, solution))
+
+    def _cache_path(self, puzzle, solution):
+        # Every state on the path knows the rest of the solution
+        bottles = [list(bottle) for bottle in puzzle]
+        for step, (source, destination) in enumerate(solution):
+            self.cache[pack(bottles, self.capacity)] = solution[step:]
+            top_color = bottles[source][-1]
+            while bottles[source] and bottles[source][-1] == top_color:
+                bottles[destination].append(bottles[source].pop())
+        self.cache[pack(bottles, self.capacity)] = []
+
+
+class DeadlockWorker:
+    """
+    Runs the bounded deadlock search ('DeadlockDetector.search_check') on a background
+    thread, like 'HintWorker' does for the solver. Only the latest request counts:
+    requests superseded before they start are skipped and 'poll' drops their results.
+    """
+    def __init__(self, capacity, max_nodes=2000):
+        self.detector = DeadlockDetector(capacity, max_nodes=max_nodes)
+
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        self._generation = 0
+        self._thread = threading.Thread(target=self._run, name="deadlock-worker", daemon=True)
+        self._thread.start()
+
+    def request(self, puzzle):
+        """
+        Ask whether 'puzzle' is a deadlock. Returns a request id that 'poll' results carry.
+        """
+        self._generation += 1
+        self._requests.put((self._generation, to_state(puzzle)))
+        return self._generation
+
+    def poll(self):
+        """
+        Return (request id, verdict) for the latest request once it is done, or None.
+        'verdict' is True (deadlock), False (solvable) or None (search budget ran out).
+        """
+        while True:
+            try:
+                generation, verdict = self._results.get_nowait()
+            except queue.Empty:
+                return None
+            if generation == self._generation:
+                return generation, verdict
+
+    def close(self):
+        self._requests.put(None)
+
+    def _run(self):
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            generation, state = item
+            if generation != self._generation:
+                continue  # Superseded before it started
+            self._results.put((generation, self.detector.search_check(state)))
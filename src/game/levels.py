@@ -0,0 +1,289 @@
+"""
+Level packs: pre-generated puzzles with difficulty data, in one file read through mmap.
+
+Every level stores its configuration (bottles, capacity, colors), the length of an
+optimal solution, the average branching factor along that solution and the number of
+deadlocks next to it (legal pours that lead to a position with no pour left). Sorted
+indexes on (bottles, field) answer range queries with two binary searches:
+
+    with LevelPack("levels.wsl") as pack:
+        numbers = pack.query("length", 30, 35, num_bottles=12)
+        game = pack.new_game(random.choice(numbers))
+
+Only the levels that are read are decoded. Build a pack with 'build_levels' and
+'write_level_pack', or from the command line:
+
+    python -m game.levels build levels.wsl 12,4,10 14,4,12 --count 1000
+    python -m game.levels query levels.wsl length 30 35 --bottles 12
+"""
+import argparse
+import bisect
+import mmap
+import os
+import struct
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from game.game import Game
+from game.packed import pack, unpack
+from game.state import GameState
+from solver.astar import AStarSolver
+from solver.moves import to_state, legal_moves, apply_move, is_solved_state
+
+MAGIC = b"WSLV"
+HEADER = struct.Struct("<4sII4x")       # magic, version, number of levels
+META = struct.Struct("<BBBxHHfQ")       # bottles, capacity, colors, length, deadlocks, branching, data offset
+ENTRY = struct.Struct("<I")             # level number in a sorted index
+VERSION = 1
+
+FIELDS = ("length", "branching", "deadlocks")
+FIELD_POSITIONS = {"length": 3, "branching": 5, "deadlocks": 4}   # Position of each field in META
+
+Level = namedtuple("Level", ["num_bottles", "capacity", "num_colors", "length", "branching", "deadlocks", "puzzle"])
+
+
+def level_stats(puzzle, capacity, solver_options=None):
+    """
+    Solve 'puzzle' optimally and return (length, branching, deadlocks), or None when
+    the solver finds no solution within 'solver_options' budget.
+    """
+    solution = AStarSolver(capacity, **(solver_options or {})).solve(puzzle)
+    if solution is None:
+        return None
+
+    state = to_state(puzzle)
+    moves = 0
+    deadlocks = 0
+    for move in solution:
+        for candidate in legal_moves(state, capacity):
+            moves += 1
+            child = apply_move(state, *candidate)
+            if not is_solved_state(child, capacity) and next(legal_moves(child, capacity), None) is None:
+                deadlocks += 1
+        state = apply_move(state, *move)
+    branching = moves / len(solution) if solution else 0.0
+    return len(solution), branching, deadlocks
+
+
+def _level_from_puzzle(task):
+    puzzle, capacity, solver_options = task
+    stats = level_stats(puzzle, capacity, solver_options)
+    if stats is None:
+        return None
+    num_colors = len({color for bottle in puzzle for color in bottle})
+    return Level(len(puzzle), capacity, num_colors, *stats, puzzle)
+
+
+def build_levels(puzzles, capacity, solver_options=None, workers=1):
+    """
+    Compute the difficulty data of 'puzzles' on a process pool. Yields a Level per
+    puzzle solved within the budget, in input order.
+    """
+    tasks = ((puzzle, capacity, solver_options) for puzzle in puzzles)
+    if workers <= 1:
+        results = map(_level_from_puzzle, tasks)
+        yield from (level for level in results if level is not None)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for level in executor.map(_level_from_puzzle, tasks, chunksize=16):
+            if level is not None:
+                yield level
+
+
+def write_level_pack(filename, levels):
+    """
+    Write 'levels' (an iterable of Level) to 'filename'. Returns the number written.
+    Puzzles are packed one after the other; only the fixed-size metadata and the
+    indexes are kept in memory while writing.
+    """
+    metas = []
+    data_filename = filename + ".tmp"
+    with open(data_filename, "wb") as data_file:
+        for level in levels:
+            offset = data_file.tell()
+            data_file.write(pack(level.puzzle, level.capacity))
+            metas.append((level.num_bottles, level.capacity, level.num_colors, level.length,
+                          level.deadlocks, level.branching, offset))
+
+    count = len(metas)
+    indexes = []
+    for field in FIELDS:
+        position = FIELD_POSITIONS[field]
+        order = sorted(range(count), key=lambda number: (metas[number][0], metas[number][position]))
+        indexes.append(b"".join(ENTRY.pack(number) for number in order))
+
+    with open(filename, "wb") as pack_file, open(data_filename, "rb") as data_file:
+        pack_file.write(HEADER.pack(MAGIC, VERSION, count))
+        for meta in metas:
+            pack_file.write(META.pack(*meta))
+        for index in indexes:
+            pack_file.write(index)
+        while True:
+            chunk = data_file.read(1 << 20)
+            if not chunk:
+                break
+            pack_file.write(chunk)
+    os.remove(data_filename)
+    return count
+
+
+class _SortedKeys:
+    """
+    (bottles, field value) of the levels in index order, as a sequence for 'bisect'.
+    """
+    def __init__(self, level_pack, field):
+        self.level_pack = level_pack
+        self.field = field
+
+    def __len__(self):
+        return len(self.level_pack)
+
+    def __getitem__(self, position):
+        number = self.level_pack.index_entry(self.field, position)
+        return self.level_pack.sort_key(self.field, number)
+
+
+class LevelPack:
+    """
+    Read-only view of a level pack file. 'pack[n]' decodes level n; 'query' returns
+    level numbers whose field lies in a range, in field order.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = open(filename, "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.count = HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"'{filename}' is not a level pack")
+        self._index_offset = HEADER.size + self.count * META.size
+        self._data_offset = self._index_offset + len(FIELDS) * self.count * ENTRY.size
+
+    def close(self):
+        if self._data is not None:
+            self._data.close()
+            self._file.close()
+            self._data = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def meta(self, number):
+        """
+        (bottles, capacity, colors, length, deadlocks, branching, data offset) of a level.
+        """
+        return META.unpack_from(self._data, HEADER.size + number * META.size)
+
+    def sort_key(self, field, number):
+        meta = self.meta(number)
+        return meta[0], meta[FIELD_POSITIONS[field]]
+
+    def index_entry(self, field, position):
+        offset = self._index_offset + (FIELDS.index(field) * self.count + position) * ENTRY.size
+        return ENTRY.unpack_from(self._data, offset)[0]
+
+    def __getitem__(self, number):
+        if number < 0:
+            number += self.count
+        if not 0 <= number < self.count:
+            raise IndexError(f"Level {number} is not in the pack ({self.count} levels)")
+        num_bottles, capacity, num_colors, length, deadlocks, branching, offset = self.meta(number)
+        start = self._data_offset + offset
+        puzzle = unpack(self._data[start:start + num_bottles * capacity], capacity)
+        return Level(num_bottles, capacity, num_colors, length, branching, deadlocks, puzzle)
+
+    def bottle_counts(self):
+        """
+        Distinct bottle counts in the pack, found by jumping between index groups.
+        """
+        keys = _SortedKeys(self, FIELDS[0])
+        counts = []
+        position = 0
+        while position < self.count:
+            num_bottles = keys[position][0]
+            counts.append(num_bottles)
+            position = bisect.bisect_left(keys, (num_bottles + 1,))
+        return counts
+
+    def query(self, field, low, high, num_bottles=None, capacity=None, num_colors=None):
+        """
+        Level numbers with 'low' <= field <= 'high', optionally for one bottle count,
+        found in O(log n) per bottle count. 'capacity' and 'num_colors' filter the
+        matches further.
+        """
+        if field not in FIELDS:
+            raise ValueError(f"Unknown field '{field}', expected one of {FIELDS}")
+        keys = _SortedKeys(self, field)
+        numbers = []
+        for bottles in ([num_bottles] if num_bottles is not None else self.bottle_counts()):
+            start = bisect.bisect_left(keys, (bottles, low))
+            stop = bisect.bisect_right(keys, (bottles, high))
+            numbers.extend(self.index_entry(field, position) for position in range(start, stop))
+        if capacity is not None or num_colors is not None:
+            numbers = [number for number in numbers
+                       if (capacity is None or self.meta(number)[1] == capacity)
+                       and (num_colors is None or self.meta(number)[2] == num_colors)]
+        return numbers
+
+    def new_game(self, number):
+        """
+        Start a Game from level 'number' instead of a random puzzle. Returns None if
+        the stored puzzle is not a valid game.
+        """
+        level = self[number]
+        game = Game(level.num_bottles, level.capacity, level.num_colors, puzzle=level.puzzle)
+        return game if game.GAMESTATE == GameState.SUCCESS else None
+
+
+def _parse_config(text):
+    try:
+        num_bottles, capacity, num_colors = (int(part) for part in text.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Expected BOTTLES,CAPACITY,COLORS, got '{text}'")
+    return num_bottles, capacity, num_colors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and query level packs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Generate, solve and store levels (needs NumPy)")
+    build.add_argument("filename")
+    build.add_argument("configs", nargs="+", type=_parse_config, help="BOTTLES,CAPACITY,COLORS")
+    build.add_argument("--count", type=int, default=100, help="Puzzles generated per configuration")
+    build.add_argument("--seed", type=int, default=0)
+    build.add_argument("--max-nodes", type=int, default=500_000)
+    build.add_argument("--workers", type=int, default=1)
+
+    query = commands.add_parser("query", help="List levels whose field lies in a range")
+    query.add_argument("filename")
+    query.add_argument("field", choices=FIELDS)
+    query.add_argument("low", type=float)
+    query.add_argument("high", type=float)
+    query.add_argument("--bottles", type=int, default=None)
+    query.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        from game.generator import generate_puzzles
+
+        def all_levels():
+            for num_bottles, capacity, num_colors in args.configs:
+                puzzles, _ = generate_puzzles(num_bottles, capacity, num_colors, args.count, seed=args.seed)
+                yield from build_levels(puzzles, capacity, {"max_nodes": args.max_nodes}, args.workers)
+
+        print(f"{write_level_pack(args.filename, all_levels())} levels written to {args.filename}")
+    else:
+        with LevelPack(args.filename) as level_pack:
+            numbers = level_pack.query(args.field, args.low, args.high, num_bottles=args.bottles)
+            print(f"{len(numbers)} levels")
+            for number in numbers[:args.limit]:
+                level = level_pack[number]
+                print(f"#{number}: {level.num_bottles}/{level.capacity}/{level.num_colors} length {level.length} "
+                      f"branching {level.branching:.2f} deadlocks {level.deadlocks}")
@@ -0,0 +1,306 @@
+"""
+Shortens recorded move lists without changing where they lead.
+
+A log is replayed from its initial puzzle while every exact state is hashed:
+  - cycles are cut back to the first visit of a repeated state (this also drops
+    pours that change nothing),
+  - every window of up to 'window' pours is replaced by a shorter sequence of legal
+    pours reaching the same exact state, when one exists (this merges pours such as
+    'a -> b, b -> c' into 'a -> c').
+Both passes repeat until nothing changes. The result is replayed once more and must
+end in the same exact state, so it is equivalent to the original log; it is written
+in the 'Game.export_game' (or 'export_record') format, so 'import_game' accepts it.
+Output files keep their paths relative to the inputs' common directory.
+
+    python -m game.optimizer games/ --output shortened/ --report report.json
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from game.gamelog import iter_game_log, write_game_log
+from game.record import decode_record, encode_record
+from solver.moves import to_state, top_run
+from util.util import print_error, print_info
+
+DEFAULT_WINDOW = 3      # Longest pour sequence the local search tries to shorten
+
+
+def pour(state, capacity, source, destination):
+    """
+    Return the state after 'Game.move(source, destination)', or None if the move is
+    rejected. 'state' is a tuple of tuples.
+    """
+    if source == destination:
+        return None
+    source_bottle = state[source]
+    if not source_bottle:
+        return None
+    color, run = top_run(source_bottle)
+    dest_bottle = state[destination]
+    if dest_bottle and dest_bottle[-1] != color:
+        return None
+    if run > capacity - len(dest_bottle):
+        return None
+    bottles = list(state)
+    bottles[destination] = dest_bottle + source_bottle[-run:]
+    bottles[source] = source_bottle[:-run]
+    return tuple(bottles)
+
+
+def _pours(state, capacity):
+    """
+    Every pour 'Game.move' accepts from 'state', with the resulting state.
+    """
+    for source in range(len(state)):
+        if not state[source]:
+            continue
+        for destination in range(len(state)):
+            child = pour(state, capacity, source, destination)
+            if child is not None:
+                yield (source, destination), child
+
+
+def replay_states(initial_puzzle, moves, capacity):
+    """
+    Return the list of states visited by 'moves' (initial state first).
+    Raises ValueError on the first move 'Game.move' would reject.
+    """
+    state = to_state(initial_puzzle)
+    states = [state]
+    for number, (source, destination) in enumerate(moves):
+        if not (0 <= source < len(state)) or not (0 <= destination < len(state)):
+            raise ValueError(f"Invalid move {number + 1} ({source + 1} -> {destination + 1})")
+        if source == destination:
+            # Accepted by 'Game.move' when the top run fits in its own free space; no change
+            bottle = state[source]
+            if not bottle or top_run(bottle)[1] > capacity - len(bottle):
+                raise ValueError(f"Invalid move {number + 1} ({source + 1} -> {destination + 1})")
+            states.append(state)
+            continue
+        state = pour(state, capacity, source, destination)
+        if state is None:
+            raise ValueError(f"Invalid move {number + 1} ({source + 1} -> {destination + 1})")
+        states.append(state)
+    return states
+
+
+def cut_cycles(moves, states):
+    """
+    Drop every stretch of moves that starts and ends in the same state.
+    Returns the new (moves, states).
+    """
+    first_visit = {states[0]: 0}
+    kept_moves = []
+    kept_states = [states[0]]
+    for move, state in zip(moves, states[1:]):
+        index = first_visit.get(state)
+        if index is not None:
+            # Back to a known state: forget everything after its first visit
+            for dropped in kept_states[index + 1:]:
+                del first_visit[dropped]
+            del kept_moves[index:]
+            del kept_states[index + 1:]
+            continue
+        first_visit[state] = len(kept_states)
+        kept_moves.append(move)
+        kept_states.append(state)
+    return kept_moves, kept_states
+
+
+def _shortcut(start, target, capacity, max_depth):
+    """
+    Breadth-first search for at most 'max_depth' pours from 'start' to exactly 'target'.
+    Returns (moves, states after each move) or None.
+    """
+    frontier = [(start, [], [])]
+    seen = {start}
+    for _ in range(max_depth):
+        next_frontier = []
+        for state, moves, states in frontier:
+            for move, child in _pours(state, capacity):
+                if child == target:
+                    return moves + [move], states + [child]
+                if child not in seen:
+                    seen.add(child)
+                    next_frontier.append((child, moves + [move], states + [child]))
+        frontier = next_frontier
+    return None
+
+
+def shorten_windows(moves, states, capacity, window=DEFAULT_WINDOW):
+    """
+    Replace each window of 2..'window' pours by a shorter equivalent, longest windows
+    first. Returns the new (moves, states).
+    """
+    moves = list(moves)
+    states = list(states)
+    index = 0
+    while index < len(moves):
+        for length in range(min(window, len(moves) - index), 1, -1):
+            found = _shortcut(states[index], states[index + length], capacity, length - 1)
+            if found is not None:
+                shortcut_moves, shortcut_states = found
+                moves[index:index + length] = shortcut_moves
+                states[index + 1:index + length + 1] = shortcut_states
+                break
+        else:
+            index += 1
+    return moves, states
+
+
+def shorten(initial_puzzle, moves, capacity, window=DEFAULT_WINDOW):
+    """
+    Return a move list that leads from 'initial_puzzle' to the same exact state as
+    'moves' and is never longer. Raises ValueError if 'moves' is not a valid replay.
+    """
+    states = replay_states(initial_puzzle, moves, capacity)
+    final_state = states[-1]
+    while True:
+        length = len(moves)
+        moves, states = cut_cycles(moves, states)
+        if window > 1:
+            moves, states = shorten_windows(moves, states, capacity, window)
+        if len(moves) == length:
+            break
+
+    # Equivalence check: replay from scratch, exactly as 'Game.move' would
+    if replay_states(initial_puzzle, moves, capacity)[-1] != final_state:
+        raise AssertionError("Shortened moves do not reach the original final state")
+    return moves
+
+
+def read_game(filename, capacity=None):
+    """
+    Read (initial puzzle, moves, capacity, solved flag) from a CSV log or binary record.
+    """
+    if filename.endswith('.wsr'):
+        with open(filename, 'rb') as record_file:
+            record = decode_record(record_file.read())
+        return record.initial_puzzle, record.moves_history, record.capacity, record.is_game_solved
+
+    initial_puzzle, moves, solved = None, [], False
+    with open(filename, 'r', newline='') as csvfile:
+        for kind, value, _ in iter_game_log(csvfile):
+            if kind == 'initial':
+                initial_puzzle = value
+            elif kind == 'move':
+                moves.append(value)
+            else:
+                solved = value
+    if capacity is None:
+        capacity = max((len(bottle) for bottle in initial_puzzle), default=0)
+    return initial_puzzle, moves, capacity, solved
+
+
+def optimize_file(filename, output_filename, capacity=None, window=DEFAULT_WINDOW):
+    """
+    Shorten one exported game and write it to 'output_filename' in the same format.
+    Returns (moves before, moves after).
+    """
+    initial_puzzle, moves, capacity, solved = read_game(filename, capacity)
+    if initial_puzzle is None or any(len(bottle) > capacity for bottle in initial_puzzle):
+        raise ValueError("invalid initial puzzle")
+    shortened = shorten(initial_puzzle, moves, capacity, window)
+
+    # Written directly, not through 'Game': workers stay silent and errors are raised
+    output_directory = os.path.dirname(output_filename)
+    if output_directory:
+        os.makedirs(output_directory, exist_ok=True)
+    if output_filename.endswith('.wsr'):
+        with open(output_filename, 'wb') as record_file:
+            record_file.write(encode_record(initial_puzzle, shortened, capacity, solved))
+    else:
+        with open(output_filename, 'w', newline='') as csvfile:
+            write_game_log(csvfile, initial_puzzle, shortened, solved)
+    return len(moves), len(shortened)
+
+
+def _optimize_batch(task):
+    """
+    Shorten a batch of files in a worker process. Nothing is printed here; the parent
+    reports the results.
+    """
+    pairs, capacity, window = task
+    results = []
+    for filename, output_filename in pairs:
+        try:
+            before, after = optimize_file(filename, output_filename, capacity, window)
+            results.append({"game": filename, "output": output_filename, "before": before, "after": after})
+        except (OSError, ValueError, AssertionError) as e:
+            results.append({"game": filename, "error": str(e)})
+    return results
+
+
+def optimize(paths, output_dir, workers=None, capacity=None, window=DEFAULT_WINDOW, batch_size=64):
+    """
+    Shorten every game (.csv, .wsr) under 'paths' into 'output_dir' on a process pool.
+    Each output keeps its path relative to the common directory of the inputs, so
+    games with the same name in different directories do not overwrite each other.
+    Returns a summary report (dict).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    filenames = []
+    for path in paths:
+        names = [os.path.join(path, name) for name in sorted(os.listdir(path))] if os.path.isdir(path) else [path]
+        filenames.extend(os.path.abspath(name) for name in names if name.endswith(('.csv', '.wsr')))
+    filenames = list(dict.fromkeys(filenames))     # The same file given twice is done once
+    root = os.path.commonpath([os.path.dirname(name) for name in filenames]) if filenames else ""
+    pairs = [(name, os.path.join(output_dir, os.path.relpath(name, root))) for name in filenames]
+    tasks = [(pairs[start:start + batch_size], capacity, window) for start in range(0, len(pairs), batch_size)]
+
+    start_time = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch_results in executor.map(_optimize_batch, tasks):
+            for result in batch_results:
+                if "error" in result:
+                    print_error(f"{result['game']}: {result['error']}")
+                else:
+                    print_info(f"{result['game']}: {result['before']} -> {result['after']} moves, "
+                               f"written to {result['output']}")
+            results.extend(batch_results)
+    elapsed = time.perf_counter() - start_time
+
+    done = [result for result in results if "error" not in result]
+    before = sum(result["before"] for result in done)
+    after = sum(result["after"] for result in done)
+    return {
+        "games": len(done),
+        "errors": [result for result in results if "error" in result],
+        "moves_before": before,
+        "moves_after": after,
+        "reduction": 1 - after / before if before else 0.0,
+        "elapsed": elapsed,
+    }
+
+
+def add_arguments(parser):
+    parser.add_argument("paths", nargs="+", help="Files or directories (.csv, .wsr)")
+    parser.add_argument("--output", required=True, help="Directory for the shortened games")
+    parser.add_argument("--report", default=None, help="Write the JSON report to this file")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="Longest pour window to shorten")
+    parser.add_argument("--capacity", type=int, default=None, help="Bottle capacity of CSV logs (default: tallest bottle)")
+
+
+def main(args):
+    """
+    Shorten the games selected by parsed 'args' and print the report. Returns the exit
+    status: 0 when every game was shortened.
+    """
+    report = optimize(args.paths, args.output, workers=args.workers, capacity=args.capacity, window=args.window)
+    text = json.dumps(report, indent=2)
+    if args.report:
+        with open(args.report, "w") as report_file:
+            report_file.write(text)
+    print(text)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shorten the move lists of exported games.")
+    add_arguments(parser)
+    raise SystemExit(main(parser.parse_args()))
@@ -0,0 +1,64 @@
+"""
+Compact immutable keys for puzzle states.
+
+A state is packed into 'bytes' with one byte per cell: each bottle takes 'capacity'
+bytes, bottom first, padded with 0 (colors start at 1). Bytes objects are immutable,
+cache their hash and cost a single allocation, unlike a list of lists.
+
+The canonical key sorts the bottles, so every permutation of the same layout maps to
+the same key. Use it for transposition tables and caches, not to replay moves: the
+bottle indices of a canonical key do not match the original puzzle.
+"""
+
+def _padding(capacity):
+    return [bytes(capacity - height) for height in range(capacity + 1)]
+
+
+def pack(puzzle, capacity):
+    """
+    Pack a 'Game.puzzle' (or any sequence of bottles) into bytes, keeping bottle order.
+    """
+    padding = _padding(capacity)
+    return b"".join(bytes(bottle) + padding[len(bottle)] for bottle in puzzle)
+
+
+def canonical(puzzle, capacity):
+    """
+    Pack a puzzle with its bottles sorted, so permuted layouts share one key.
+    """
+    padding = _padding(capacity)
+    return b"".join(sorted(bytes(bottle) + padding[len(bottle)] for bottle in puzzle))
+
+
+def canonicalize(key, capacity):
+    """
+    Sort the bottles of an already packed key.
+    """
+    return b"".join(sorted(key[i:i + capacity] for i in range(0, len(key), capacity)))
+
+
+def unpack(key, capacity):
+    """
+    Rebuild the list-of-lists 'Game.puzzle' shape from a packed key.
+    """
+    puzzle = []
+    for i in range(0, len(key), capacity):
+        chunk = key[i:i + capacity]
+        height = capacity - chunk.count(0)
+        puzzle.append(list(chunk[:height]))
+    return puzzle
+
+
+class CanonicalKeyer:
+    """
+    Callable that turns tuple-of-tuple states into canonical keys, with the padding
+    table prepared once for a given capacity. Used in search hot loops.
+    """
+    __slots__ = ("padding",)
+
+    def __init__(self, capacity):
+        self.padding = _padding(capacity)
+
+    def __call__(self, state):
+        padding = self.padding
+        return b"".join(sorted([bytes(bottle) + padding[len(bottle)] for bottle in state]))
@@ -0,0 +1,212 @@
+import mmap
+import os
+import struct
+from collections import namedtuple
+
+from game.packed import pack, unpack
+
+MAGIC = b"WSGR"
+HEADER = struct.Struct("<4sBBBxI")  # magic, bottles, capacity, flags, move count
+INDEX_MAGIC = b"WSGI"
+INDEX_HEADER = struct.Struct("<4s4xQ")  # magic, end of the last indexed record in the data file
+OFFSET = struct.Struct("<Q")
+FLAG_SOLVED = 0x01
+
+GameRecord = namedtuple("GameRecord", ["num_bottles", "capacity", "is_game_solved", "initial_puzzle", "moves_history"])
+
+
+def encode_record(initial_puzzle, moves_history, capacity, is_game_solved):
+    """
+    Encode one game: a fixed header (solved flag included), one byte per cell of the
+    initial state and two bytes per move.
+    """
+    num_bottles = len(initial_puzzle)
+    if num_bottles > 255 or capacity > 255:
+        raise ValueError("Binary records support at most 255 bottles and capacity 255.")
+    flags = FLAG_SOLVED if is_game_solved else 0
+    header = HEADER.pack(MAGIC, num_bottles, capacity, flags, len(moves_history))
+    moves = bytes(index for move in moves_history for index in move)
+    return header + pack(initial_puzzle, capacity) + moves
+
+
+def record_size(data, offset=0):
+    """
+    Size in bytes of the record starting at 'offset'.
+    """
+    _, num_bottles, capacity, _, num_moves = HEADER.unpack_from(data, offset)
+    return HEADER.size + num_bottles * capacity + 2 * num_moves
+
+
+def decode_record(data, offset=0):
+    """
+    Decode the record starting at 'offset' of a bytes-like object (bytes, mmap, ...).
+    """
+    magic, num_bottles, capacity, flags, num_moves = HEADER.unpack_from(data, offset)
+    if magic != MAGIC:
+        raise ValueError(f"No game record at offset {offset}")
+    start = offset + HEADER.size
+    state_end = start + num_bottles * capacity
+    if state_end + 2 * num_moves > len(data):
+        raise ValueError(f"Truncated game record at offset {offset}")
+    moves = data[state_end:state_end + 2 * num_moves]
+    return GameRecord(
+        num_bottles,
+        capacity,
+        bool(flags & FLAG_SOLVED),
+        unpack(data[start:state_end], capacity),
+        list(zip(moves[0::2], moves[1::2])),
+    )
+
+
+class GameArchive:
+    """
+    Append-only file of binary game records with a separate offset index
+    ('<filename>.idx': a header with the end of the last record it covers, then one
+    uint64 per game).
+
+    Reads go through mmap, so 'archive[n]' decodes game n without touching the others.
+    Use 'append' to add games (or 'append_game' for a 'Game'). The index is rebuilt
+    from the records with 'rebuild_index' when it is lost, or stale because a crash
+    came between the data and index writes.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.index_filename = filename + ".idx"
+        self._data = None
+        self._index = None
+        self._files = []
+        if os.path.exists(filename) and not self._index_current():
+            self.rebuild_index()
+
+    def _indexed_end(self):
+        """
+        End of the last record the index covers, or None if there is no valid index.
+        """
+        try:
+            with open(self.index_filename, "rb") as index_file:
+                header = index_file.read(INDEX_HEADER.size)
+        except OSError:
+            return None
+        if len(header) != INDEX_HEADER.size:
+            return None
+        magic, data_end = INDEX_HEADER.unpack(header)
+        return data_end if magic == INDEX_MAGIC else None
+
+    def _index_current(self):
+        """
+        True if the index covers every complete record of the data file. Bytes after
+        'data_end' are fine as long as they do not hold a complete record (a torn write).
+        """
+        data_end = self._indexed_end()
+        size = os.path.getsize(self.filename)
+        if data_end is None or data_end > size:
+            return False
+        if size - data_end < HEADER.size:
+            return True
+        with open(self.filename, "rb") as data_file:
+            data_file.seek(data_end)
+            return data_end + record_size(data_file.read(HEADER.size)) > size
+
+    def append(self, initial_puzzle, moves_history, capacity, is_game_solved):
+        """
+        Append one game and return its number. A torn record left by a crash is cut off
+        first, so the new record starts right after the last complete one.
+        """
+        record = encode_record(initial_puzzle, moves_history, capacity, is_game_solved)
+        self._close_maps()
+        if not os.path.exists(self.filename):
+            open(self.filename, "wb").close()
+            with open(self.index_filename, "wb") as index_file:
+                index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, 0))
+        elif not self._index_current():
+            self.rebuild_index()
+        offset = self._indexed_end()
+        with open(self.filename, "r+b") as data_file, open(self.index_filename, "r+b") as index_file:
+            data_file.truncate(offset)
+            data_file.seek(offset)
+            data_file.write(record)
+            data_file.flush()
+            index_file.seek(0, os.SEEK_END)
+            index_file.write(OFFSET.pack(offset))
+            number = (index_file.tell() - INDEX_HEADER.size) // OFFSET.size - 1
+            # Written last: until then the index does not match the data and gets rebuilt
+            index_file.seek(0)
+            index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, offset + len(record)))
+            return number
+
+    def append_game(self, game):
+        return self.append(game.initial_puzzle, game.moves_history, game.capacity, game.is_game_solved)
+
+    def rebuild_index(self):
+        """
+        Scan the records and rewrite the offset index. A truncated last record is ignored;
+        the index header keeps the end of the last complete record, where 'append'
+        continues. The data file is read through mmap and offsets are streamed to the new
+        index, so memory does not grow with the archive. Returns that end offset.
+        """
+        self._close_maps()
+        size = os.path.getsize(self.filename)
+        temp_filename = self.index_filename + ".tmp"
+        offset = 0
+        with open(self.filename, "rb") as data_file, open(temp_filename, "wb") as index_file:
+            index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, 0))
+            if size:
+                with mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    while offset + HEADER.size <= size:
+                        end = offset + record_size(data, offset)
+                        if end > size:
+                            break
+                        index_file.write(OFFSET.pack(offset))
+                        offset = end
+            index_file.seek(0)
+            index_file.write(INDEX_HEADER.pack(INDEX_MAGIC, offset))
+        os.replace(temp_filename, self.index_filename)
+        return offset
+
+    def _open_maps(self):
+        if self._data is not None:
+            return
+        for filename in (self.filename, self.index_filename):
+            if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+                self._data = self._index = b""
+                return
+        data_file = open(self.filename, "rb")
+        index_file = open(self.index_filename, "rb")
+        self._files = [data_file, index_file]
+        self._data = mmap.mmap(data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._index = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _close_maps(self):
+        for mapping in (self._data, self._index):
+            if isinstance(mapping, mmap.mmap):
+                mapping.close()
+        for handle in self._files:
+            handle.close()
+        self._data = self._index = None
+        self._files = []
+
+    def close(self):
+        self._close_maps()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __len__(self):
+        self._open_maps()
+        return max(0, len(self._index) - INDEX_HEADER.size) // OFFSET.size
+
+    def __getitem__(self, number):
+        count = len(self)
+        if number < 0:
+            number += count
+        if not 0 <= number < count:
+            raise IndexError(f"Game {number} is not in the archive ({count} games)")
+        (offset,) = OFFSET.unpack_from(self._index, INDEX_HEADER.size + number * OFFSET.size)
+        return decode_record(self._data, offset)
+
+    def __iter__(self):
+        for number in range(len(self)):
+            yield self[number]
@@ -0,0 +1,221 @@
+"""
+Headless batch verifier for exported games.
+
+Replays every game of a directory (CSV logs, binary records, archives) with 'Game.move'
+on a process pool and checks the recorded 'Game Solved' flag against 'is_solved()'.
+Nothing here imports the GUI, so pygame is never loaded.
+
+    python -m game.verifier games/ --report report.json
+"""
+import argparse
+import json
+import os
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from game.game import Game
+from game.gamelog import iter_game_log
+from game.record import GameArchive, decode_record
+from game.state import GameState
+
+BATCH_SIZE = 512        # Games handed to a worker at once
+MAX_FAILURES = 1000     # Failures listed in the report
+
+# Verdicts
+OK = "ok"                       # Replay valid, solved flag matches
+FALSE_CLAIM = "false_claim"     # Claims solved, final state is not
+UNCLAIMED = "unclaimed"         # Final state is solved, flag says otherwise
+INVALID_MOVE = "invalid_move"   # A recorded move is rejected by 'Game.move'
+ERROR = "error"                 # Unreadable file or impossible layout
+
+
+def replay(initial_puzzle, moves, claimed_solved, capacity=None):
+    """
+    Replay one game and return (verdict, detail).
+    'capacity' defaults to the tallest bottle of the initial puzzle.
+    """
+    if capacity is None:
+        capacity = max((len(bottle) for bottle in initial_puzzle), default=0)
+    num_colors = len({color for bottle in initial_puzzle for color in bottle})
+    game = Game(len(initial_puzzle), capacity, num_colors, puzzle=initial_puzzle)
+    if game.GAMESTATE != GameState.SUCCESS:
+        return ERROR, "invalid initial puzzle"
+
+    for number, (source, destination) in enumerate(moves):
+        if not game.move(source, destination, record=False):
+            return INVALID_MOVE, f"move {number + 1} ({source + 1} -> {destination + 1})"
+
+    solved = game.is_solved()
+    if claimed_solved and not solved:
+        return FALSE_CLAIM, "claims solved"
+    if solved and not claimed_solved:
+        return UNCLAIMED, "solved but not claimed"
+    return OK, None
+
+
+def verify_log(filename, capacity=None):
+    """
+    Verify one CSV log, streaming it. Returns (verdict, detail).
+    """
+    try:
+        with open(filename, 'r', newline='') as csvfile:
+            game = None
+            claimed = False
+            for kind, value, line in iter_game_log(csvfile):
+                if kind == 'initial':
+                    if capacity is None:
+                        game_capacity = max((len(bottle) for bottle in value), default=0)
+                    else:
+                        game_capacity = capacity
+                    num_colors = len({color for bottle in value for color in bottle})
+                    game = Game(len(value), game_capacity, num_colors, puzzle=value)
+                    if game.GAMESTATE != GameState.SUCCESS:
+                        return ERROR, "invalid initial puzzle"
+                elif kind == 'move':
+                    source, destination = value
+                    if not game.move(source, destination, record=False):
+                        return INVALID_MOVE, f"line {line} ({source + 1} -> {destination + 1})"
+                elif kind == 'solved':
+                    claimed = value
+    except (OSError, ValueError) as e:
+        return ERROR, str(e)
+
+    solved = game.is_solved()
+    if claimed and not solved:
+        return FALSE_CLAIM, "claims solved"
+    if solved and not claimed:
+        return UNCLAIMED, "solved but not claimed"
+    return OK, None
+
+
+def _verify_batch(task):
+    """
+    Verify a batch of work items in a worker process.
+    Items are ('csv', path), ('record', path) or ('archive', path, start, stop).
+    """
+    items, capacity = task
+    counts = {}
+    failures = []
+
+    def note(name, verdict, detail):
+        counts[verdict] = counts.get(verdict, 0) + 1
+        if verdict != OK:
+            failures.append({"game": name, "verdict": verdict, "detail": detail})
+
+    for item in items:
+        kind, path = item[0], item[1]
+        if kind == 'csv':
+            note(path, *verify_log(path, capacity))
+        elif kind == 'record':
+            try:
+                with open(path, 'rb') as record_file:
+                    record = decode_record(record_file.read())
+                note(path, *replay(record.initial_puzzle, record.moves_history, record.is_game_solved, record.capacity))
+            except (OSError, ValueError, struct.error) as e:
+                note(path, ERROR, str(e))
+        else:
+            start, stop = item[2], item[3]
+            try:
+                with GameArchive(path) as archive:
+                    if stop is None:
+                        stop = len(archive)
+                    for number in range(start, stop):
+                        try:
+                            record = archive[number]
+                        except (ValueError, IndexError, struct.error) as e:
+                            note(f"{path}#{number}", ERROR, str(e))
+                            continue
+                        note(f"{path}#{number}", *replay(record.initial_puzzle, record.moves_history,
+                                                         record.is_game_solved, record.capacity))
+            except (OSError, ValueError, struct.error) as e:
+                note(path, ERROR, str(e))
+    return counts, failures
+
+
+def collect_work(paths):
+    """
+    Expand files and directories into work items, splitting archives into slices.
+    """
+    items = []
+    for path in paths:
+        if os.path.isdir(path):
+            names = sorted(os.listdir(path))
+            filenames = [os.path.join(path, name) for name in names]
+        else:
+            filenames = [path]
+        for filename in filenames:
+            if filename.endswith('.csv'):
+                items.append(('csv', filename))
+            elif filename.endswith('.wsr'):
+                items.append(('record', filename))
+            elif filename.endswith('.wsa'):
+                try:
+                    with GameArchive(filename) as archive:
+                        count = len(archive)
+                except (OSError, ValueError, struct.error):
+                    items.append(('archive', filename, 0, None))  # Reported as ERROR by the worker
+                    continue
+                for start in range(0, count, BATCH_SIZE):
+                    items.append(('archive', filename, start, min(count, start + BATCH_SIZE)))
+    return items
+
+
+def verify(paths, workers=None, capacity=None):
+    """
+    Verify every game under 'paths' and return a summary report (dict).
+    """
+    items = collect_work(paths)
+    # Archive slices already hold a batch of games each
+    batches = []
+    files = [item for item in items if item[0] != 'archive']
+    for start in range(0, len(files), BATCH_SIZE):
+        batches.append(files[start:start + BATCH_SIZE])
+    batches.extend([item] for item in items if item[0] == 'archive')
+
+    start_time = time.perf_counter()
+    counts = {}
+    failures = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for batch_counts, batch_failures in executor.map(_verify_batch, [(batch, capacity) for batch in batches]):
+            for verdict, count in batch_counts.items():
+                counts[verdict] = counts.get(verdict, 0) + count
+            failures.extend(batch_failures[:MAX_FAILURES - len(failures)])
+    elapsed = time.perf_counter() - start_time
+
+    games = sum(counts.values())
+    return {
+        "games": games,
+        "verdicts": counts,
+        "elapsed": elapsed,
+        "games_per_second": games / elapsed if elapsed > 0 else 0.0,
+        "workers": workers or os.cpu_count(),
+        "failures": failures,
+    }
+
+
+def add_arguments(parser):
+    parser.add_argument("paths", nargs="+", help="Files or directories (.csv, .wsr, .wsa)")
+    parser.add_argument("--report", default=None, help="Write the JSON report to this file")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--capacity", type=int, default=None, help="Bottle capacity of CSV logs (default: tallest bottle)")
+
+
+def main(args):
+    """
+    Verify the games selected by parsed 'args' and print the report. Returns the exit
+    status: 0 when every game is ok.
+    """
+    report = verify(args.paths, workers=args.workers, capacity=args.capacity)
+    text = json.dumps(report, indent=2)
+    if args.report:
+        with open(args.report, "w") as report_file:
+            report_file.write(text)
+    print(text if not args.report else json.dumps({key: report[key] for key in report if key != "failures"}, indent=2))
+    return 0 if report["games"] == report["verdicts"].get(OK, 0) else 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay exported games and check their solved flag.")
+    add_arguments(parser)
+    raise SystemExit(main(parser.parse_args()))
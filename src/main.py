@@ -1,16 +1,259 @@
+"""
+Command line entry point.
+
+    python main.py                                  # play 6 bottles, capacity 4, 4 colors
+    python main.py play --bottles 8 --colors 6
+    python main.py generate 1000 --bottles 12 --colors 10 --output pack.jsonl
+    python main.py solve --seed 7 --bottles 8 --colors 6
+    python main.py solve --load game.csv --export solved.csv
+    python main.py play --pack levels.wsl --bottles 12 --difficulty 30-35
+    python main.py replay games/ --report report.json
+    python main.py optimize games/ --output shortened/
+    python main.py bench game_move astar_nodes
+
+Modules are imported by the subcommand that needs them: pygame only by 'play', NumPy
+only by 'generate' (and the benchmarks using it), so the headless paths start fast and
+need no display.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+
 from game.game  import Game
 from game.state import GameState
-from game.gui   import GameGUI
-from util.util  import print_error
+from util.util  import print_error, print_info
 
-if __name__ == "__main__":
-    num_bottles = 6
-    capacity = 4
-    num_colors = 4
-
-    game = Game(num_bottles, capacity, num_colors)
-    if game.GAMESTATE == GameState.SUCCESS:
-        gui = GameGUI(game)
-        gui.start()
+DEFAULT_BOTTLES = 6
+DEFAULT_CAPACITY = 4
+DEFAULT_COLORS = 4
+
+
+def add_layout_arguments(parser):
+    parser.add_argument("--bottles", type=int, default=DEFAULT_BOTTLES)
+    parser.add_argument("--capacity", type=int, default=DEFAULT_CAPACITY)
+    parser.add_argument("--colors", type=int, default=DEFAULT_COLORS)
+    parser.add_argument("--seed", type=int, default=None, help="Seed of the random puzzle")
+
+
+def load_game(filename, capacity=None):
+    """
+    Build a Game from an exported CSV log or binary record, replaying its moves.
+    'capacity' defaults to the tallest bottle of the initial puzzle for CSV logs.
+    Returns None if the file cannot be replayed.
+    """
+    if filename.endswith('.wsr'):
+        from game.record import decode_record
+        with open(filename, 'rb') as record_file:
+            record = decode_record(record_file.read())
+        initial_puzzle, capacity = record.initial_puzzle, record.capacity
     else:
-        print_error("Failed to initialize the game.")
\ No newline at end of file
+        from game.gamelog import iter_game_log
+        with open(filename, 'r', newline='') as csvfile:
+            initial_puzzle = next((value for kind, value, _ in iter_game_log(csvfile) if kind == 'initial'), None)
+        if initial_puzzle is None:
+            print_error(f"No initial puzzle in {filename}.")
+            return None
+        if capacity is None:
+            capacity = max((len(bottle) for bottle in initial_puzzle), default=0)
+
+    num_colors = len({color for bottle in initial_puzzle for color in bottle})
+    game = Game(len(initial_puzzle), capacity, num_colors, puzzle=initial_puzzle)
+    if game.GAMESTATE != GameState.SUCCESS:
+        return None
+    replayed = game.load_record(record) if filename.endswith('.wsr') else game.import_game(filename)
+    return game if replayed else None
+
+
+def new_game(args):
+    """
+    Build the game selected by '--load' or by the layout arguments. Returns None on failure.
+    """
+    if getattr(args, "load", None):
+        return load_game(args.load)
+    if getattr(args, "pack", None):
+        return level_game(args)
+    if args.seed is not None:
+        random.seed(args.seed)
+    game = Game(args.bottles, args.capacity, args.colors)
+    return game if game.GAMESTATE == GameState.SUCCESS else None
+
+
+def level_game(args):
+    """
+    Start a random level of '--pack' with '--bottles' bottles and an optimal solution
+    length in the '--difficulty' range. Returns None when no level matches.
+    """
+    from game.levels import LevelPack
+    low, _, high = args.difficulty.partition("-")
+    if args.seed is not None:
+        random.seed(args.seed)
+    with LevelPack(args.pack) as level_pack:
+        numbers = level_pack.query("length", int(low), int(high or low), num_bottles=args.bottles)
+        if not numbers:
+            print_error(f"No {args.bottles}-bottle level of difficulty {args.difficulty} in {args.pack}.")
+            return None
+        return level_pack.new_game(random.choice(numbers))
+
+
+def add_level_arguments(parser):
+    parser.add_argument("--pack", default=None, help="Pick a level from this level pack instead of a random puzzle")
+    parser.add_argument("--difficulty", default="0-65535", help="Optimal solution length range, LOW-HIGH")
+
+
+def command_play(args):
+    game = new_game(args)
+    if game is None:
+        print_error("Failed to initialize the game.")
+        return 1
+    from game.gui import GameGUI
+    gui = GameGUI(game)
+    gui.start()
+    return 0
+
+
+def command_generate(args):
+    from game.generator import generate_puzzles
+    solver_options = {"max_nodes": args.max_nodes}
+    start_time = time.perf_counter()
+    puzzles, lengths = generate_puzzles(args.bottles, args.capacity, args.colors, args.count, seed=args.seed,
+                                        check_solvable=args.check_solvable, min_moves=args.min_moves,
+                                        solver_options=solver_options, workers=args.workers)
+    elapsed = time.perf_counter() - start_time
+
+    if args.output and args.output.endswith('.wsa'):
+        from game.record import GameArchive
+        with GameArchive(args.output) as archive:
+            for puzzle in puzzles:
+                archive.append(puzzle, [], args.capacity, False)
+    else:
+        output = open(args.output, 'w') if args.output else sys.stdout
+        try:
+            for puzzle, length in zip(puzzles, lengths):
+                output.write(json.dumps({"puzzle": puzzle, "capacity": args.capacity, "solution_length": length}) + "\n")
+        finally:
+            if output is not sys.stdout:
+                output.close()
+    if args.output:
+        print_info(f"Generated {len(puzzles)} puzzles in {elapsed:.2f}s to {args.output}.")
+    return 0
+
+
+def command_solve(args):
+    from solver.solver import create_solver
+    game = new_game(args)
+    if game is None:
+        print_error("Failed to initialize the game.")
+        return 1
+
+    solver = create_solver(args.method, game.capacity, max_nodes=args.max_nodes, time_limit=args.time_limit)
+    solution = solver.solve(game.puzzle)
+    result = {
+        "status": solver.status,
+        "moves": solution,
+        "length": None if solution is None else len(solution),
+        "nodes_expanded": solver.nodes_expanded,
+        "elapsed": solver.elapsed,
+    }
+    print(json.dumps(result))
+
+    if solution is not None and args.export:
+        for source, destination in solution:
+            game.move(source, destination)
+        game.is_game_solved = game.is_solved()
+        if args.export.endswith('.wsr'):
+            game.export_record(args.export)
+        else:
+            game.export_game(args.export)
+    return 0 if solution is not None else 1
+
+
+def command_replay(args):
+    from game import verifier
+    parser = argparse.ArgumentParser(prog="main.py replay", description="Replay exported games and check their solved flag.")
+    verifier.add_arguments(parser)
+    return verifier.main(parser.parse_args(args.arguments))
+
+
+def command_optimize(args):
+    from game import optimizer
+    parser = argparse.ArgumentParser(prog="main.py optimize", description="Shorten the move lists of exported games.")
+    optimizer.add_arguments(parser)
+    return optimizer.main(parser.parse_args(args.arguments))
+
+
+def command_bench(args):
+    from bench import bench
+    parser = argparse.ArgumentParser(prog="main.py bench", description="Run the performance benchmarks.")
+    bench.add_arguments(parser)
+    return bench.main(parser.parse_args(args.arguments))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Water sort puzzle: play, generate, solve, replay, optimize and benchmark.")
+    parser.add_argument("--metrics", default=None, help="Collect metrics and write them as JSON to this file")
+    commands = parser.add_subparsers(dest="command")
+
+    play = commands.add_parser("play", help="Play in a pygame window")
+    add_layout_arguments(play)
+    play.add_argument("--load", default=None, help="Continue an exported game (.csv or .wsr)")
+    add_level_arguments(play)
+    play.set_defaults(handler=command_play)
+
+    generate = commands.add_parser("generate", help="Generate puzzles in bulk (needs NumPy)")
+    generate.add_argument("count", type=int)
+    add_layout_arguments(generate)
+    generate.add_argument("--output", default=None, help="JSON lines file, or a .wsa archive (default: stdout)")
+    generate.add_argument("--check-solvable", action="store_true", help="Keep only puzzles the A* solver solves")
+    generate.add_argument("--min-moves", type=int, default=1)
+    generate.add_argument("--max-nodes", type=int, default=200_000)
+    generate.add_argument("--workers", type=int, default=1)
+    generate.set_defaults(handler=command_generate)
+
+    solve = commands.add_parser("solve", help="Solve a random or exported puzzle")
+    add_layout_arguments(solve)
+    solve.add_argument("--load", default=None, help="Solve from the end of an exported game (.csv or .wsr)")
+    add_level_arguments(solve)
+    solve.add_argument("--method", default="astar")
+    solve.add_argument("--max-nodes", type=int, default=2_000_000)
+    solve.add_argument("--time-limit", type=float, default=None)
+    solve.add_argument("--export", default=None, help="Export the solved game (.csv or .wsr)")
+    solve.set_defaults(handler=command_solve)
+
+    # Their own modules parse the arguments, so they are only imported when used
+    replay = commands.add_parser("replay", help="Verify exported games headlessly", add_help=False)
+    replay.set_defaults(handler=command_replay, forward=True)
+
+    optimize = commands.add_parser("optimize", help="Shorten the move lists of exported games", add_help=False)
+    optimize.set_defaults(handler=command_optimize, forward=True)
+
+    bench = commands.add_parser("bench", help="Run the performance benchmarks", add_help=False)
+    bench.set_defaults(handler=command_bench, forward=True)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    argv = sys.argv[1:] if argv is None else argv
+    args, arguments = parser.parse_known_args(argv)
+    if getattr(args, "forward", False):
+        args.arguments = arguments
+    elif arguments:
+        parser.error(f"unrecognized arguments: {' '.join(arguments)}")
+
+    if args.metrics:
+        from util import metrics
+        metrics.enable()
+    if args.command is None:
+        # No subcommand: play the default game, like before the subcommands existed
+        args = parser.parse_args(argv + ["play"])
+    status = args.handler(args)
+    if args.metrics:
+        with open(args.metrics, 'w') as output:
+            json.dump(metrics.registry.snapshot(), output, indent=2)
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,306 @@
+"""
+Imitation learning dataset from solver solutions.
+
+Seeded puzzles (see 'solver.sweep.instance_puzzle') are solved, and every state along
+a solution, replayed with 'Game.move', becomes one sample:
+
+    state     (num_bottles, capacity, num_colors) one-hot, bottom cell first
+    legal     (num_bottles * num_bottles,) mask of pours 'Game.move' accepts and that
+              change the puzzle; action 'a' pours 'a // num_bottles' into
+              'a % num_bottles', as in 'VecWaterSortEnv'
+    action    expert action
+    distance  pours left to the solution (optimal with the default A* solver)
+
+Samples go to shards of 'shard_size' puzzles, one directory each, written by the
+workers themselves so the parent never holds samples. The one-hot states and legal
+masks are bit-packed (8 cells per byte); every array is a plain .npy file, so
+'ShardedDataset' reads them with np.load(mmap_mode='r') and decodes only the samples
+asked for. A finished shard is renamed into place, so an interrupted run resumes with
+the missing shards.
+
+    python -m rl.dataset data/ 12,4,10 --puzzles 100000 --shard-size 1000 --workers 8
+"""
+import argparse
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import numpy as np
+
+from game.game import Game
+from game.state import GameState
+from solver.solver import create_solver
+from solver.sweep import instance_puzzle, parse_config
+from util.util import print_error, print_info
+
+MANIFEST = "manifest.json"
+ARRAYS = ("states", "legal", "actions", "distance")
+
+
+def shard_name(number):
+    return f"shard-{number:05d}"
+
+
+def encode_state(puzzle, capacity, num_colors):
+    """
+    One-hot encode a 'Game.puzzle' as a bool (num_bottles, capacity, num_colors) array.
+    """
+    cells = np.zeros((len(puzzle), capacity), dtype=np.int16)
+    for index, bottle in enumerate(puzzle):
+        cells[index, :len(bottle)] = bottle
+    return cells[..., None] == np.arange(1, num_colors + 1, dtype=np.int16)
+
+
+def solution_samples(puzzle, solution, capacity, num_colors):
+    """
+    Replay 'solution' with 'Game.move' and return (states, legal, actions, distance)
+    arrays with one row per pour.
+    """
+    num_bottles = len(puzzle)
+    game = Game(num_bottles, capacity, num_colors, puzzle=puzzle)
+    if game.GAMESTATE != GameState.SUCCESS:
+        raise ValueError("invalid puzzle")
+
+    steps = len(solution)
+    states = np.zeros((steps, num_bottles, capacity, num_colors), dtype=bool)
+    legal = np.zeros((steps, num_bottles * num_bottles), dtype=bool)
+    actions = np.zeros(steps, dtype=np.int16)
+    distance = np.arange(steps, 0, -1, dtype=np.int16)
+    for step, (source, destination) in enumerate(solution):
+        states[step] = encode_state(game.puzzle, capacity, num_colors)
+        for legal_source, legal_destination in game.legal_moves():
+            legal[step, legal_source * num_bottles + legal_destination] = True
+        actions[step] = source * num_bottles + destination
+        if not game.move(source, destination, record=False):
+            raise ValueError(f"solution move {step + 1} rejected by Game.move")
+    if not game.is_solved():
+        raise ValueError("solution does not solve the puzzle")
+    return states, legal, actions, distance
+
+
+def _build_shard(task):
+    """
+    Solve the puzzles of one shard and write it. Runs in worker processes.
+    Returns the shard's manifest entry.
+    """
+    output_dir, number, seed, config, start, stop, method, solver_options = task
+    num_bottles, capacity, num_colors = config
+    solver = create_solver(method, capacity, **solver_options)
+
+    parts = {name: [] for name in ARRAYS}
+    unsolved = 0
+    for index in range(start, stop):
+        puzzle = instance_puzzle(seed, num_bottles, capacity, num_colors, index)
+        solution = solver.solve(puzzle)
+        if solution is None:
+            unsolved += 1
+            continue
+        if not solution:
+            continue  # Already solved, nothing to learn
+        for name, array in zip(ARRAYS, solution_samples(puzzle, solution, capacity, num_colors)):
+            parts[name].append(array)
+
+    count = sum(len(array) for array in parts["actions"])
+    if count:
+        states = np.concatenate(parts["states"]).reshape(count, -1)
+        legal = np.concatenate(parts["legal"])
+        arrays = {
+            "states": np.packbits(states, axis=1),
+            "legal": np.packbits(legal, axis=1),
+            "actions": np.concatenate(parts["actions"]),
+            "distance": np.concatenate(parts["distance"]),
+        }
+    else:
+        arrays = {
+            "states": np.zeros((0, (num_bottles * capacity * num_colors + 7) // 8), dtype=np.uint8),
+            "legal": np.zeros((0, (num_bottles * num_bottles + 7) // 8), dtype=np.uint8),
+            "actions": np.zeros(0, dtype=np.int16),
+            "distance": np.zeros(0, dtype=np.int16),
+        }
+
+    # Write under a temporary name, then rename: a shard directory is always complete
+    final_dir = os.path.join(output_dir, shard_name(number))
+    temp_dir = final_dir + ".tmp"
+    shutil.rmtree(temp_dir, ignore_errors=True)
+    os.makedirs(temp_dir)
+    for name, array in arrays.items():
+        np.save(os.path.join(temp_dir, name + ".npy"), array)
+    shutil.rmtree(final_dir, ignore_errors=True)  # Left by a run killed before its manifest update
+    os.replace(temp_dir, final_dir)
+    return {"shard": shard_name(number), "puzzles": stop - start, "unsolved": unsolved, "samples": count}
+
+
+def build_dataset(output_dir, config, puzzles, shard_size=1000, seed=0, method="astar", solver_options=None,
+                  workers=None, max_in_flight=None):
+    """
+    Build (or resume) a dataset of 'puzzles' instances of 'config'
+    (num_bottles, capacity, num_colors) in 'output_dir'. At most 'max_in_flight'
+    shards (default twice the workers) are being built at once, which bounds memory.
+    Returns the manifest dict.
+    """
+    num_bottles, capacity, num_colors = config
+    solver_options = dict(solver_options or {"max_nodes": 500_000, "time_limit": 30})
+    os.makedirs(output_dir, exist_ok=True)
+    manifest_path = os.path.join(output_dir, MANIFEST)
+    manifest = {
+        "num_bottles": num_bottles,
+        "capacity": capacity,
+        "num_colors": num_colors,
+        "seed": seed,
+        "method": method,
+        "solver_options": solver_options,
+        "shard_size": shard_size,
+        "shards": [],
+    }
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as manifest_file:
+            previous = json.load(manifest_file)
+        # Labels from another solver or budget would mean something else: never mix them
+        changed = [key for key in ("num_bottles", "capacity", "num_colors", "seed", "method", "solver_options",
+                                   "shard_size") if previous.get(key) != manifest[key]]
+        if changed:
+            raise ValueError(f"'{output_dir}' holds a dataset with different settings ({', '.join(changed)})")
+        manifest["shards"] = previous["shards"]
+    done = {entry["shard"]: entry["puzzles"] for entry in manifest["shards"]}
+
+    tasks = []
+    for number, start in enumerate(range(0, puzzles, shard_size)):
+        stop = min(puzzles, start + shard_size)
+        if done.get(shard_name(number)) == stop - start:
+            continue
+        if shard_name(number) in done:
+            # A last shard that now has to hold more puzzles
+            manifest["shards"] = [entry for entry in manifest["shards"] if entry["shard"] != shard_name(number)]
+            del done[shard_name(number)]
+        tasks.append((output_dir, number, seed, tuple(config), start, stop, method, solver_options))
+    if not tasks:
+        print_info(f"Nothing to do, {len(done)} shards already in {output_dir}.")
+        return manifest
+
+    print_info(f"Building {len(tasks)} shards ({len(done)} already done).")
+    start_time = time.perf_counter()
+    workers = workers or os.cpu_count()
+    max_in_flight = max_in_flight or 2 * workers
+    pending = set()
+    task_iter = iter(tasks)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            for task in task_iter:
+                pending.add(executor.submit(_build_shard, task))
+                if len(pending) >= max_in_flight:
+                    break
+            if not pending:
+                break
+            finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                manifest["shards"].append(future.result())
+            # Record progress after every shard so an interrupted run resumes
+            manifest["shards"].sort(key=lambda entry: entry["shard"])
+            with open(manifest_path + ".tmp", "w") as manifest_file:
+                json.dump(manifest, manifest_file, indent=2)
+            os.replace(manifest_path + ".tmp", manifest_path)
+            samples = sum(entry["samples"] for entry in manifest["shards"])
+            print_info(f"{len(manifest['shards'])} shards, {samples} samples, "
+                       f"{time.perf_counter() - start_time:.1f}s")
+    return manifest
+
+
+class ShardedDataset:
+    """
+    Read a dataset written by 'build_dataset'. Shards are memory-mapped; 'dataset[i]'
+    and 'batch' unpack only the requested samples.
+    """
+    def __init__(self, output_dir):
+        with open(os.path.join(output_dir, MANIFEST)) as manifest_file:
+            self.manifest = json.load(manifest_file)
+        self.num_bottles = self.manifest["num_bottles"]
+        self.capacity = self.manifest["capacity"]
+        self.num_colors = self.manifest["num_colors"]
+        self.state_shape = (self.num_bottles, self.capacity, self.num_colors)
+
+        self.shards = []
+        offsets = [0]
+        for entry in self.manifest["shards"]:
+            if not entry["samples"]:
+                continue
+            shard_dir = os.path.join(output_dir, entry["shard"])
+            self.shards.append({name: np.load(os.path.join(shard_dir, name + ".npy"), mmap_mode="r")
+                                for name in ARRAYS})
+            offsets.append(offsets[-1] + entry["samples"])
+        self.offsets = np.array(offsets, dtype=np.int64)
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def _unpack(self, shard, rows):
+        num_cells = self.num_bottles * self.capacity * self.num_colors
+        num_actions = self.num_bottles * self.num_bottles
+        states = np.unpackbits(shard["states"][rows], axis=1, count=num_cells).astype(bool)
+        legal = np.unpackbits(shard["legal"][rows], axis=1, count=num_actions).astype(bool)
+        return (states.reshape((-1,) + self.state_shape), legal,
+                np.asarray(shard["actions"][rows]), np.asarray(shard["distance"][rows]))
+
+    def batch(self, indexes):
+        """
+        Return (states, legal, actions, distance) arrays for the given sample indexes.
+        """
+        indexes = np.asarray(indexes, dtype=np.int64)
+        if not len(indexes):
+            return (np.zeros((0,) + self.state_shape, dtype=bool),
+                    np.zeros((0, self.num_bottles * self.num_bottles), dtype=bool),
+                    np.zeros(0, dtype=np.int16), np.zeros(0, dtype=np.int16))
+        shard_numbers = np.searchsorted(self.offsets, indexes, side="right") - 1
+        results = ([], [], [], [])
+        positions = []
+        for shard_number in np.unique(shard_numbers):
+            selected = np.flatnonzero(shard_numbers == shard_number)
+            rows = indexes[selected] - self.offsets[shard_number]
+            for result, array in zip(results, self._unpack(self.shards[shard_number], rows)):
+                result.append(array)
+            positions.append(selected)
+        # Back to the order of 'indexes'
+        inverse = np.argsort(np.concatenate(positions))
+        return tuple(np.concatenate(result)[inverse] for result in results)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Sample {index} is not in the dataset ({len(self)} samples)")
+        states, legal, actions, distance = self.batch([index])
+        return states[0], legal[0], int(actions[0]), int(distance[0])
+
+    def iter_batches(self, batch_size, shuffle=False, seed=None):
+        """
+        Yield (states, legal, actions, distance) batches over the whole dataset.
+        """
+        order = np.arange(len(self))
+        if shuffle:
+            np.random.default_rng(seed).shuffle(order)
+        for start in range(0, len(order), batch_size):
+            yield self.batch(order[start:start + batch_size])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build an imitation learning dataset from solver solutions.")
+    parser.add_argument("output_dir")
+    parser.add_argument("config", type=parse_config, help="BOTTLES,CAPACITY,COLORS")
+    parser.add_argument("--puzzles", type=int, default=10_000)
+    parser.add_argument("--shard-size", type=int, default=1000, help="Puzzles per shard")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--method", default="astar")
+    parser.add_argument("--max-nodes", type=int, default=500_000)
+    parser.add_argument("--time-limit", type=float, default=30)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--max-in-flight", type=int, default=None, help="Shards built at once (default: 2 per worker)")
+    args = parser.parse_args()
+
+    try:
+        build_dataset(args.output_dir, args.config, args.puzzles, shard_size=args.shard_size, seed=args.seed,
+                      method=args.method, solver_options={"max_nodes": args.max_nodes, "time_limit": args.time_limit},
+                      workers=args.workers, max_in_flight=args.max_in_flight)
+    except ValueError as e:
+        print_error(str(e))
+        raise SystemExit(1)
@@ -0,0 +1,180 @@
+import numpy as np
+
+from game.generator import shuffled_puzzles
+
+
+class VecWaterSortEnv:
+    """
+    Batch of B water sort puzzles stepped together with vectorized NumPy.
+
+    State is a (B, num_bottles, capacity) int8 array of colors (bottom first, 0 for
+    empty) plus a (B, num_bottles) height array. Action 'a' pours bottle
+    'a // num_bottles' into bottle 'a % num_bottles' with exactly the rules of
+    'Game.move': the whole top run moves, only onto an empty bottle or the same top
+    color, and only if it fits. Environments that end (solved or 'max_steps') are
+    reset from the env's seeded generator inside 'step'.
+
+    Python loops only run over 'capacity', never over environments.
+    """
+    def __init__(self, num_envs, num_bottles, capacity, num_colors, seed=None,
+                 max_steps=None, invalid_penalty=0.0):
+        if num_envs < 1:
+            raise ValueError("Number of environments must be at least 1.")
+        if num_bottles < 1 or capacity < 1 or num_colors < 1:
+            raise ValueError("Number of bottles, capacity and number of colors must be at least 1.")
+        if num_bottles <= num_colors:
+            raise ValueError("Number of bottles must be greater than number of colors.")
+        if num_colors > 127 or capacity > 127:
+            raise ValueError("Number of colors and capacity must fit in int8.")
+
+        self.num_envs = num_envs
+        self.num_bottles = num_bottles
+        self.capacity = capacity
+        self.num_colors = num_colors
+        self.num_actions = num_bottles * num_bottles
+        self.max_steps = max_steps
+        self.invalid_penalty = invalid_penalty
+
+        self.rng = np.random.default_rng(seed)
+        self.cells = np.zeros((num_envs, num_bottles, capacity), dtype=np.int8)
+        self.heights = np.zeros((num_envs, num_bottles), dtype=np.int8)
+        self.steps = np.zeros(num_envs, dtype=np.int32)
+
+        self._env_index = np.arange(num_envs)
+        self._not_self = ~np.eye(num_bottles, dtype=bool).reshape(-1)
+        self.reset()
+
+    def generate(self, count):
+        """
+        Draw 'count' random puzzles from the env's generator. Returns (cells, heights).
+        """
+        return shuffled_puzzles(self.rng, count, self.num_bottles, self.capacity, self.num_colors)
+
+    def reset(self, mask=None):
+        """
+        Regenerate every environment, or only those where 'mask' is True.
+        Returns the observation array.
+        """
+        if mask is None:
+            mask = np.ones(self.num_envs, dtype=bool)
+        count = int(mask.sum())
+        if count:
+            cells, heights = self.generate(count)
+            self.cells[mask] = cells
+            self.heights[mask] = heights
+            self.steps[mask] = 0
+        return self.cells
+
+    def load(self, index, puzzle):
+        """
+        Put a 'Game.puzzle' (list of lists) into environment 'index'.
+        """
+        self.cells[index] = 0
+        for bottle_index, bottle in enumerate(puzzle):
+            self.cells[index, bottle_index, :len(bottle)] = bottle
+            self.heights[index, bottle_index] = len(bottle)
+        self.steps[index] = 0
+
+    def get_puzzle(self, index):
+        """
+        Return environment 'index' in the list-of-lists 'Game.puzzle' shape.
+        """
+        return [
+            self.cells[index, bottle_index, :height].tolist()
+            for bottle_index, height in enumerate(self.heights[index].tolist())
+        ]
+
+    def tops(self):
+        """
+        Return (top color, top run length) arrays of shape (B, num_bottles).
+        Empty bottles have color 0 and run 0.
+        """
+        heights = self.heights.astype(np.intp)
+        filled = heights > 0
+        top_pos = np.maximum(heights - 1, 0)
+        top = np.take_along_axis(self.cells, top_pos[..., None], axis=2)[..., 0]
+        top = np.where(filled, top, 0)
+
+        run = filled.astype(np.int8)
+        same = filled.copy()
+        for depth in range(1, self.capacity):
+            pos = top_pos - depth
+            below = np.take_along_axis(self.cells, np.maximum(pos, 0)[..., None], axis=2)[..., 0]
+            same &= (pos >= 0) & (below == top)
+            run += same
+        return top, run
+
+    def legal_mask(self):
+        """
+        Boolean (B, num_bottles * num_bottles) mask of pours that 'Game.move' accepts
+        and that change the puzzle (self pours are excluded).
+        """
+        top, run = self.tops()
+        free = self.capacity - self.heights
+        color_ok = (top[:, None, :] == top[:, :, None]) | (self.heights[:, None, :] == 0)
+        fits = run[:, :, None] <= free[:, None, :]
+        mask = (top[:, :, None] > 0) & color_ok & fits
+        return mask.reshape(self.num_envs, -1) & self._not_self
+
+    def is_solved(self):
+        """
+        Boolean (B,) array: every bottle is empty or full of a single color.
+        """
+        uniform = (self.cells == self.cells[:, :, :1]).all(axis=2)
+        bottle_ok = (self.heights == 0) | ((self.heights == self.capacity) & uniform)
+        return bottle_ok.all(axis=1)
+
+    def step(self, actions):
+        """
+        Apply one pour per environment.
+        Returns (observations, rewards, dones, info); 'info' holds the 'valid',
+        'solved' and 'truncated' arrays and 'final_cells' (state before auto-reset).
+        """
+        actions = np.asarray(actions, dtype=np.intp)
+        in_range = (actions >= 0) & (actions < self.num_actions)
+        safe_actions = np.where(in_range, actions, 0)
+        source = safe_actions // self.num_bottles
+        destination = safe_actions % self.num_bottles
+        envs = self._env_index
+
+        top, run = self.tops()
+        source_color = top[envs, source]
+        dest_color = top[envs, destination]
+        source_height = self.heights[envs, source].astype(np.intp)
+        dest_height = self.heights[envs, destination].astype(np.intp)
+        move_count = run[envs, source].astype(np.intp)
+
+        valid = (
+            in_range
+            & (source_color > 0)
+            & ((dest_color == 0) | (dest_color == source_color))
+            & (move_count <= self.capacity - dest_height)
+        )
+        pour = valid & (source != destination)
+
+        for offset in range(self.capacity):
+            sel = pour & (offset < move_count)
+            if not sel.any():
+                break
+            rows = envs[sel]
+            self.cells[rows, destination[sel], dest_height[sel] + offset] = source_color[sel]
+            self.cells[rows, source[sel], source_height[sel] - 1 - offset] = 0
+        self.heights[envs[pour], source[pour]] -= move_count[pour].astype(np.int8)
+        self.heights[envs[pour], destination[pour]] += move_count[pour].astype(np.int8)
+        self.steps += 1
+
+        solved = self.is_solved()
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        if self.max_steps is not None:
+            truncated = ~solved & (self.steps >= self.max_steps)
+        dones = solved | truncated
+
+        rewards = solved.astype(np.float32)
+        if self.invalid_penalty:
+            rewards -= (~valid) * np.float32(self.invalid_penalty)
+
+        info = {"valid": valid, "solved": solved, "truncated": truncated}
+        if dones.any():
+            info["final_cells"] = self.cells[dones].copy()
+            self.reset(dones)
+        return self.cells, rewards, dones, info
@@ -0,0 +1,96 @@
+"""
+Local load generator for 'server.server'.
+
+Opens '--clients' connections, each with its own session, and sends random MOVE
+requests for '--duration' seconds, keeping '--pipeline' requests in flight per
+connection. Prints the throughput, client-side round-trip percentiles and the
+server's own STATS.
+
+    python -m server.loadgen --clients 200 --duration 10
+    python -m server.loadgen --unix /tmp/watersort.sock
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+
+async def _connect(host, port, unix_path):
+    if unix_path:
+        return await asyncio.open_unix_connection(unix_path)
+    return await asyncio.open_connection(host, port)
+
+
+async def _request(reader, writer, line):
+    writer.write(line)
+    response = await reader.readline()
+    if not response.startswith(b"OK"):
+        raise RuntimeError(f"{line!r} failed: {response!r}")
+    return response
+
+
+async def _client(number, args, deadline, round_trips):
+    reader, writer = await _connect(args.host, args.port, args.unix)
+    rng = random.Random(args.seed + number)
+    response = await _request(reader, writer, b"NEW %d %d %d %d\n" % (args.bottles, args.capacity, args.colors,
+                                                                       args.seed + number))
+    session = int(response.split()[1])
+
+    moves = 0
+    while time.perf_counter() < deadline:
+        batch = b"".join(b"MOVE %d %d %d\n" % (session, rng.randrange(args.bottles), rng.randrange(args.bottles))
+                         for _ in range(args.pipeline))
+        start = time.perf_counter()
+        writer.write(batch)
+        for _ in range(args.pipeline):
+            await reader.readline()  # OK or ERR illegal, both are answered moves
+        round_trips.append((time.perf_counter() - start) / args.pipeline)
+        moves += args.pipeline
+
+    await _request(reader, writer, b"CLOSE %d\n" % session)
+    writer.close()
+    return moves
+
+
+async def run(args):
+    """
+    Run the load and return a summary dict.
+    """
+    round_trips = []
+    start = time.perf_counter()
+    deadline = start + args.duration
+    counts = await asyncio.gather(*(_client(number, args, deadline, round_trips) for number in range(args.clients)))
+    elapsed = time.perf_counter() - start
+
+    reader, writer = await _connect(args.host, args.port, args.unix)
+    server_stats = json.loads((await _request(reader, writer, b"STATS\n"))[3:])
+    writer.close()
+
+    round_trips.sort()
+    moves = sum(counts)
+    return {
+        "clients": args.clients,
+        "moves": moves,
+        "moves_per_second": moves / elapsed,
+        "client_p50_us": round_trips[len(round_trips) // 2] * 1e6 if round_trips else None,
+        "client_p99_us": round_trips[len(round_trips) * 99 // 100] * 1e6 if round_trips else None,
+        "server": server_stats,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Send random moves to a running puzzle server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7878)
+    parser.add_argument("--unix", default=None, help="Connect to this Unix socket path instead of TCP")
+    parser.add_argument("--clients", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--pipeline", type=int, default=8, help="Requests in flight per connection")
+    parser.add_argument("--bottles", type=int, default=14)
+    parser.add_argument("--capacity", type=int, default=4)
+    parser.add_argument("--colors", type=int, default=12)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
@@ -0,0 +1,289 @@
+"""
+Asyncio puzzle server: many 'Game' sessions in one process, over a local TCP or Unix
+socket.
+
+    python -m server.server --port 7878
+    python -m server.server --unix /tmp/watersort.sock
+
+The protocol is one ASCII line per request and one per response. Responses start with
+'OK' or 'ERR'; requests can be pipelined, answers come back in order.
+
+    NEW <bottles> <capacity> <colors> [seed]   -> OK <session> <state>
+    MOVE <session> <source> <destination>      -> OK <cells moved> <solved> | ERR illegal
+    STATE <session>                            -> OK <state> <solved> <moves>
+    UNDO <session>                             -> OK <state> | ERR nothing to undo
+    EXPORT <session>                           -> OK <base64 binary record>
+    CLOSE <session>                            -> OK
+    STATS                                      -> OK <JSON>
+
+Bottle indexes are 0-based. <state> is the hex of the packed puzzle (see 'game.packed'),
+<solved> is 0 or 1 and EXPORT sends a 'game.record' record. A NEW seed only fixes the
+puzzle of that session. Sessions unused for 'idle_timeout' seconds are evicted, as are
+the least recently used ones beyond 'max_sessions'.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import random
+import time
+from array import array
+from collections import OrderedDict
+
+from game.game import Game
+from game.packed import pack
+from game.record import encode_record
+from game.state import GameState
+from util import metrics
+from util.util import print_info
+
+LATENCY_WINDOW = 65536      # Most recent move latencies kept for percentiles
+MAX_LINE = 256              # Longest request accepted
+
+
+class Session:
+    __slots__ = ("game", "last_used")
+
+    def __init__(self, game):
+        self.game = game
+        self.last_used = time.monotonic()
+
+
+class PuzzleServer:
+    """
+    Owns the sessions and answers protocol lines. Everything runs on the event loop
+    thread, so sessions need no locking.
+    """
+    def __init__(self, idle_timeout=300.0, max_sessions=100_000, max_bottles=64, max_capacity=64, max_colors=63):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self.max_bottles = max_bottles
+        self.max_capacity = max_capacity
+        self.max_colors = max_colors
+        self.sessions = OrderedDict()   # Session id -> Session, least recently used first
+        self.next_id = 1
+        self.evicted = 0
+        self.requests = 0
+
+        # Ring buffer of move latencies (seconds), no allocation per move
+        self.latencies = array('d', bytes(8 * LATENCY_WINDOW))
+        self.latency_count = 0
+
+        self.commands = {
+            b"NEW": self.command_new,
+            b"MOVE": self.command_move,
+            b"STATE": self.command_state,
+            b"UNDO": self.command_undo,
+            b"EXPORT": self.command_export,
+            b"CLOSE": self.command_close,
+            b"STATS": self.command_stats,
+        }
+
+    def handle_line(self, line):
+        """
+        Answer one request line (bytes, without the newline). Returns the response bytes.
+        """
+        self.requests += 1
+        parts = line.split()
+        if not parts:
+            return b"ERR empty request\n"
+        command = self.commands.get(parts[0].upper())
+        if command is None:
+            return b"ERR unknown command\n"
+        try:
+            return command(parts)
+        except (ValueError, IndexError):
+            return b"ERR bad arguments\n"
+
+    def _session(self, token):
+        session = self.sessions.get(int(token))
+        if session is not None:
+            session.last_used = time.monotonic()
+            self.sessions.move_to_end(int(token))
+        return session
+
+    def command_new(self, parts):
+        num_bottles, capacity, num_colors = int(parts[1]), int(parts[2]), int(parts[3])
+        # Bounded before building anything: the event loop thread does the work
+        if num_bottles > self.max_bottles:
+            return b"ERR too many bottles\n"
+        if capacity > self.max_capacity:
+            return b"ERR capacity too large\n"
+        if num_colors > self.max_colors:
+            return b"ERR too many colors\n"
+        if min(num_bottles, capacity, num_colors) < 1 or num_colors >= num_bottles:
+            return b"ERR invalid configuration\n"
+        # A seed only affects this session, never the shared module RNG
+        rng = random.Random(int(parts[4])) if len(parts) > 4 else None
+        game = Game(num_bottles, capacity, num_colors, rng=rng)
+        if game.GAMESTATE != GameState.SUCCESS:
+            return b"ERR invalid configuration\n"
+
+        session_id = self.next_id
+        self.next_id += 1
+        self.sessions[session_id] = Session(game)
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+            self.evicted += 1
+        return b"OK %d %s\n" % (session_id, pack(game.puzzle, capacity).hex().encode())
+
+    def command_move(self, parts):
+        start = time.perf_counter()
+        session = self._session(parts[1])
+        if session is None:
+            return b"ERR no session\n"
+        game = session.game
+        if game.move(int(parts[2]), int(parts[3])):
+            response = b"OK %d %d\n" % (game.undo_stack[-1][2], game.is_solved())
+        else:
+            response = b"ERR illegal\n"
+
+        elapsed = time.perf_counter() - start
+        self.latencies[self.latency_count % LATENCY_WINDOW] = elapsed
+        self.latency_count += 1
+        if metrics.enabled:
+            metrics.observe("server_move_seconds", elapsed)
+        return response
+
+    def command_state(self, parts):
+        session = self._session(parts[1])
+        if session is None:
+            return b"ERR no session\n"
+        game = session.game
+        return b"OK %s %d %d\n" % (pack(game.puzzle, game.capacity).hex().encode(), game.is_solved(),
+                                   len(game.moves_history))
+
+    def command_undo(self, parts):
+        session = self._session(parts[1])
+        if session is None:
+            return b"ERR no session\n"
+        game = session.game
+        if not game.undo():
+            return b"ERR nothing to undo\n"
+        return b"OK %s\n" % pack(game.puzzle, game.capacity).hex().encode()
+
+    def command_export(self, parts):
+        session = self._session(parts[1])
+        if session is None:
+            return b"ERR no session\n"
+        game = session.game
+        record = encode_record(game.initial_puzzle, game.moves_history, game.capacity, game.is_solved())
+        return b"OK %s\n" % base64.b64encode(record)
+
+    def command_close(self, parts):
+        if self.sessions.pop(int(parts[1]), None) is None:
+            return b"ERR no session\n"
+        return b"OK\n"
+
+    def command_stats(self, parts):
+        return b"OK %s\n" % json.dumps(self.stats()).encode()
+
+    def latency_percentiles(self):
+        """
+        Return (p50, p99) in seconds over the last LATENCY_WINDOW moves, or (None, None).
+        """
+        count = min(self.latency_count, LATENCY_WINDOW)
+        if not count:
+            return None, None
+        ordered = sorted(self.latencies[:count])
+        return ordered[count // 2], ordered[min(count - 1, count * 99 // 100)]
+
+    def stats(self):
+        p50, p99 = self.latency_percentiles()
+        return {
+            "sessions": len(self.sessions),
+            "evicted": self.evicted,
+            "requests": self.requests,
+            "moves": self.latency_count,
+            "move_p50_us": None if p50 is None else p50 * 1e6,
+            "move_p99_us": None if p99 is None else p99 * 1e6,
+        }
+
+    def evict_idle(self):
+        """
+        Drop sessions unused for 'idle_timeout' seconds. Returns how many were dropped.
+        """
+        deadline = time.monotonic() - self.idle_timeout
+        dropped = 0
+        sessions = self.sessions
+        while sessions:
+            session_id, session = next(iter(sessions.items()))
+            if session.last_used > deadline:
+                break
+            del sessions[session_id]
+            dropped += 1
+        self.evicted += dropped
+        return dropped
+
+    async def evict_loop(self):
+        interval = max(1.0, self.idle_timeout / 10)
+        while True:
+            await asyncio.sleep(interval)
+            self.evict_idle()
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                if len(line) > MAX_LINE:
+                    writer.write(b"ERR line too long\n")
+                    break
+                writer.write(self.handle_line(line))
+                if writer.transport.get_write_buffer_size() > 65536:
+                    await writer.drain()
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(server, host="127.0.0.1", port=7878, unix_path=None, report_interval=None):
+    """
+    Serve 'server' until cancelled. With 'unix_path' listen on a Unix socket instead of TCP.
+    """
+    if unix_path:
+        listener = await asyncio.start_unix_server(server.handle_client, path=unix_path, limit=MAX_LINE * 4)
+        print_info(f"Serving puzzles on {unix_path}")
+    else:
+        listener = await asyncio.start_server(server.handle_client, host, port, limit=MAX_LINE * 4)
+        print_info(f"Serving puzzles on {host}:{port}")
+
+    tasks = [asyncio.ensure_future(server.evict_loop())]
+    if report_interval:
+        tasks.append(asyncio.ensure_future(_report_loop(server, report_interval)))
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def _report_loop(server, interval):
+    while True:
+        await asyncio.sleep(interval)
+        print_info(json.dumps(server.stats()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve water sort sessions over a local socket.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7878)
+    parser.add_argument("--unix", default=None, help="Listen on this Unix socket path instead of TCP")
+    parser.add_argument("--idle-timeout", type=float, default=300.0)
+    parser.add_argument("--max-sessions", type=int, default=100_000)
+    parser.add_argument("--max-bottles", type=int, default=64)
+    parser.add_argument("--max-capacity", type=int, default=64)
+    parser.add_argument("--max-colors", type=int, default=63)
+    parser.add_argument("--report-interval", type=float, default=None, help="Print stats every N seconds")
+    args = parser.parse_args()
+
+    puzzle_server = PuzzleServer(idle_timeout=args.idle_timeout, max_sessions=args.max_sessions,
+                                 max_bottles=args.max_bottles, max_capacity=args.max_capacity,
+                                 max_colors=args.max_colors)
+    try:
+        asyncio.run(serve(puzzle_server, args.host, args.port, args.unix, args.report_interval))
+    except KeyboardInterrupt:
+        print_info(json.dumps(puzzle_server.stats()))
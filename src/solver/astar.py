@@ -0,0 +1,125 @@
+import heapq
+import itertools
+import time
+
+from solver.moves import to_state, legal_moves, apply_move, is_solved_state
+from solver.heuristic import fragments
+from game.packed import CanonicalKeyer
+from util import metrics
+
+
+class AStarSolver:
+    """
+    A* search over pour moves. Returns a minimal list of (source, destination) moves,
+    the same shape as 'Game.moves_history'.
+
+    The search is bounded by 'max_nodes' (number of stored states) and 'time_limit'
+    (seconds). When a bound is hit 'solve' returns None and 'status' tells why.
+    Setting 'stop_event' (a threading.Event) from another thread cancels the search.
+    'prune', if given, is called on every new state and drops it when it returns True
+    (see 'solver.deadlock.DeadlockDetector').
+    """
+    def __init__(self, capacity, max_nodes=2_000_000, time_limit=None, heuristic=fragments, stop_event=None,
+                 prune=None):
+        self.capacity = capacity
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.heuristic = heuristic
+        self.stop_event = stop_event
+        self.prune = prune
+
+        self.nodes_expanded = 0
+        self.nodes_generated = 0
+        self.nodes_pruned = 0
+        self.elapsed = 0.0
+        self.status = None
+
+    def solve(self, puzzle):
+        start_time = time.perf_counter()
+        self.nodes_expanded = 0
+        self.nodes_generated = 0
+        self.nodes_pruned = 0
+        self.status = None
+
+        root = to_state(puzzle)
+        capacity = self.capacity
+        heuristic = self.heuristic
+        prune = self.prune
+        keyer = CanonicalKeyer(capacity)
+
+        # Canonical key -> (g, parent key, move). Permuted layouts share one record;
+        # the heap keeps the concrete state so moves use the original bottle indices.
+        root_key = keyer(root)
+        records = {root_key: (0, None, None)}
+        closed = set()
+        counter = itertools.count()
+        frontier = [(heuristic(root), 0, next(counter), root, root_key, None)]
+
+        while frontier:
+            _, g, _, state, key, last_move = heapq.heappop(frontier)
+            if key in closed:
+                continue
+            if records[key][0] < g:
+                continue  # Stale heap entry
+
+            if is_solved_state(state, capacity):
+                self.status = "solved"
+                self.elapsed = time.perf_counter() - start_time
+                if metrics.enabled:
+                    self._record_metrics()
+                return self._build_path(records, key)
+
+            closed.add(key)
+            self.nodes_expanded += 1
+
+            if self.nodes_expanded % 1024 == 0:
+                if self.time_limit is not None and time.perf_counter() - start_time > self.time_limit:
+                    self.status = "timeout"
+                    break
+                if self.stop_event is not None and self.stop_event.is_set():
+                    self.status = "cancelled"
+                    break
+
+            for move in legal_moves(state, capacity, last_move):
+                child = apply_move(state, *move)
+                child_key = keyer(child)
+                if child_key in closed:
+                    continue
+                record = records.get(child_key)
+                if record is not None and record[0] <= g + 1:
+                    continue
+                if prune is not None and prune(child):
+                    closed.add(child_key)  # Dead for good, never look at it again
+                    self.nodes_pruned += 1
+                    continue
+                records[child_key] = (g + 1, key, move)
+                self.nodes_generated += 1
+                heapq.heappush(frontier, (g + 1 + heuristic(child), g + 1, next(counter), child, child_key, move))
+
+            if len(records) > self.max_nodes:
+                self.status = "node_limit"
+                break
+        else:
+            self.status = "unsolvable"
+
+        self.elapsed = time.perf_counter() - start_time
+        if metrics.enabled:
+            self._record_metrics()
+        return None
+
+    def _record_metrics(self):
+        metrics.count("solver_runs", solver="astar", status=self.status)
+        metrics.count("solver_nodes_expanded", self.nodes_expanded, solver="astar")
+        metrics.count("solver_nodes_generated", self.nodes_generated, solver="astar")
+        metrics.count("solver_nodes_pruned", self.nodes_pruned, solver="astar")
+        metrics.observe("solver_seconds", self.elapsed, solver="astar")
+
+    def _build_path(self, records, key):
+        path = []
+        _, parent, move = records[key]
+        while parent is not None:
+            path.append(move)
+            key = parent
+            _, parent, move = records[key]
+        path.reverse()
+        return path
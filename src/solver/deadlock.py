@@ -0,0 +1,176 @@
+from collections import OrderedDict
+
+from solver.moves import to_state, legal_moves, apply_move, is_solved_state
+from solver.heuristic import move_score
+from game.packed import CanonicalKeyer
+from util import metrics
+
+
+class DeadlockDetector:
+    """
+    Detects states from which the puzzle can no longer be solved, in two tiers:
+
+      - 'quick_check': no useful pour is left, or every pour leads to a state whose
+        only way on is pouring straight back (ping-pong). Costs a few move generations.
+      - 'search_check': bounded depth-first search for a solved state, at most
+        'max_nodes' states. Verdicts are cached per canonical state (up to
+        'cache_entries'), so states seen by an earlier search are answered at once.
+
+    Both only report a deadlock when it is certain, so either can be passed as 'prune'
+    to the solvers. 'quick_check' is cheap enough for every generated state; calling
+    the detector runs both tiers. 'stats' reports how often each tier found one.
+    """
+    def __init__(self, capacity, max_nodes=10_000, cache_entries=100_000):
+        self.capacity = capacity
+        self.max_nodes = max_nodes
+        self.cache_entries = cache_entries
+        self.keyer = CanonicalKeyer(capacity)
+        self.cache = OrderedDict()      # Canonical key -> True (dead) or False (solvable)
+
+        self.quick_checks = 0
+        self.quick_hits = 0
+        self.search_checks = 0
+        self.search_hits = 0
+        self.search_unknown = 0
+        self.cache_hits = 0
+
+    def __call__(self, state):
+        return self.is_dead(state)
+
+    def is_dead(self, state):
+        """
+        True when 'state' (tuple of tuples, or a 'Game.puzzle') is proven unsolvable,
+        trying the cheap tier first.
+        """
+        if not isinstance(state, tuple):
+            state = to_state(state)
+        return self.quick_check(state) or self.search_check(state) is True
+
+    def check_game(self, game):
+        return self.is_dead(game.puzzle)
+
+    def quick_check(self, state):
+        """
+        Tier 1: True if no pour leads anywhere new.
+        """
+        if not isinstance(state, tuple):
+            state = to_state(state)
+        self.quick_checks += 1
+        dead = self._stuck(state)
+        if dead:
+            self.quick_hits += 1
+        if metrics.enabled:
+            metrics.count("deadlock_checks", tier="quick", dead=dead)
+        return dead
+
+    def _stuck(self, state):
+        capacity = self.capacity
+        if is_solved_state(state, capacity):
+            return False
+        parent_key = None
+        for move in legal_moves(state, capacity):
+            child = apply_move(state, *move)
+            if is_solved_state(child, capacity):
+                return False
+            source, destination = move
+            for child_move in legal_moves(child, capacity):
+                if child_move != (destination, source):
+                    return False
+                # Pouring back may not restore the parent (the run can have grown)
+                if parent_key is None:
+                    parent_key = self.keyer(state)
+                if self.keyer(apply_move(child, *child_move)) != parent_key:
+                    return False
+        return True
+
+    def search_check(self, state):
+        """
+        Tier 2: True if no solved state is reachable, False if one is, None when the
+        search ran out of 'max_nodes' first.
+        """
+        if not isinstance(state, tuple):
+            state = to_state(state)
+        self.search_checks += 1
+        verdict = self._search(state)
+        if verdict is True:
+            self.search_hits += 1
+        elif verdict is None:
+            self.search_unknown += 1
+        if metrics.enabled:
+            metrics.count("deadlock_checks", tier="search", dead=verdict)
+        return verdict
+
+    def _search(self, state):
+        capacity = self.capacity
+        keyer = self.keyer
+        cache = self.cache
+        root_key = keyer(state)
+        cached = cache.get(root_key)
+        if cached is not None:
+            self.cache_hits += 1
+            cache.move_to_end(root_key)
+            return cached
+        if is_solved_state(state, capacity):
+            # Solved states have no useful pour left, but are the opposite of dead
+            self._store(root_key, False)
+            return False
+
+        visited = {root_key}
+        # Stack of (state, key, remaining children), children best first
+        stack = [(state, root_key, self._children(state))]
+        while stack:
+            _, _, children = stack[-1]
+            if not children:
+                stack.pop()
+                continue
+            child = children.pop()
+            child_key = keyer(child)
+            if child_key in visited:
+                continue
+            cached = cache.get(child_key)
+            if cached is True:
+                self.cache_hits += 1
+                continue
+            if cached is False or is_solved_state(child, capacity):
+                if cached is False:
+                    self.cache_hits += 1
+                # Everything on the stack leads to a solution
+                for _, key, _ in stack:
+                    self._store(key, False)
+                self._store(child_key, False)
+                return False
+            visited.add(child_key)
+            if len(visited) > self.max_nodes:
+                return None
+            stack.append((child, child_key, self._children(child)))
+
+        # Exhausted: nothing reachable from here is solvable
+        for key in visited:
+            self._store(key, True)
+        return True
+
+    def _children(self, state):
+        capacity = self.capacity
+        moves = sorted(legal_moves(state, capacity), key=lambda move: move_score(state, capacity, move))
+        return [apply_move(state, *move) for move in moves]
+
+    def _store(self, key, verdict):
+        cache = self.cache
+        if key in cache:
+            cache.move_to_end(key)
+        elif len(cache) >= self.cache_entries:
+            cache.popitem(last=False)
+        cache[key] = verdict
+
+    def stats(self):
+        return {
+            "quick_checks": self.quick_checks,
+            "quick_hits": self.quick_hits,
+            "quick_hit_rate": self.quick_hits / self.quick_checks if self.quick_checks else 0.0,
+            "search_checks": self.search_checks,
+            "search_hits": self.search_hits,
+            "search_unknown": self.search_unknown,
+            "search_hit_rate": self.search_hits / self.search_checks if self.search_checks else 0.0,
+            "cache_hits": self.cache_hits,
+            "cache_entries": len(self.cache),
+        }
@@ -0,0 +1,40 @@
+from solver.moves import top_run
+
+
+def fragments(state):
+    """
+    Admissible heuristic: number of color fragments (runs) over all bottles minus the
+    number of distinct colors.
+
+    A pour moves exactly one top run, so it can merge at most two fragments into one.
+    A solved puzzle has exactly one fragment per color, so the value never overestimates
+    the number of pours left.
+    """
+    runs = 0
+    colors = set()
+    for bottle in state:
+        previous = None
+        for color in bottle:
+            if color != previous:
+                runs += 1
+                previous = color
+        colors.update(bottle)
+    return runs - len(colors)
+
+
+def move_score(state, capacity, move):
+    """
+    Cheap preference for a pour, higher is better. Pouring onto a matching color
+    removes a fragment; filling a bottle or emptying the source is better still.
+    """
+    source, destination = move
+    source_bottle, dest_bottle = state[source], state[destination]
+    _, run = top_run(source_bottle)
+    score = 0
+    if dest_bottle:
+        score += 2
+        if len(dest_bottle) + run == capacity:
+            score += 2
+    if run == len(source_bottle):
+        score += 1
+    return score
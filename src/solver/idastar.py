@@ -0,0 +1,145 @@
+import time
+
+from solver.moves import to_state, legal_moves, apply_move, is_solved_state
+from solver.heuristic import fragments
+from game.packed import CanonicalKeyer
+from solver.table import MAX_VALUE
+from util import metrics
+
+
+class IDAStarSolver:
+    """
+    Iterative deepening A* over pour moves. Memory stays proportional to the solution
+    depth, which makes it the better choice for larger boards where A* runs out of
+    'max_nodes'. Returns a minimal list of (source, destination) moves or None.
+
+    With a 'table' (see 'solver.table.TranspositionTable') every fully searched state
+    stores a lower bound on its distance to the solution, which raises the heuristic
+    on transpositions and across runs sharing the table. Setting 'stop_event'
+    (a threading.Event) from another thread cancels the search. 'prune', if given, is
+    called on every child state and skips it when it returns True (see
+    'solver.deadlock.DeadlockDetector'); it must only reject unsolvable states.
+    """
+    def __init__(self, capacity, max_nodes=20_000_000, time_limit=None, heuristic=fragments, table=None,
+                 stop_event=None, prune=None):
+        self.capacity = capacity
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.heuristic = heuristic
+        self.table = table
+        self.stop_event = stop_event
+        self.prune = prune
+
+        self.nodes_expanded = 0
+        self.nodes_pruned = 0
+        self.elapsed = 0.0
+        self.status = None
+
+    def solve(self, puzzle):
+        self._start_time = time.perf_counter()
+        self.nodes_expanded = 0
+        self.nodes_pruned = 0
+        self.status = None
+
+        root = to_state(puzzle)
+        self._keyer = CanonicalKeyer(self.capacity)
+        self._path = []
+        root_key = self._keyer(root)
+        self._on_path = {root_key}
+
+        bound = self._estimate(root, root_key)
+        while True:
+            result, _ = self._search(root, root_key, 0, bound, None)
+            if result is True:
+                self.status = "solved"
+                break
+            if self.status is not None:
+                break  # Budget exceeded
+            if result is None:
+                self.status = "unsolvable"
+                break
+            bound = result
+
+        self.elapsed = time.perf_counter() - self._start_time
+        if metrics.enabled:
+            metrics.count("solver_runs", solver="idastar", status=self.status)
+            metrics.count("solver_nodes_expanded", self.nodes_expanded, solver="idastar")
+            metrics.count("solver_nodes_pruned", self.nodes_pruned, solver="idastar")
+            metrics.observe("solver_seconds", self.elapsed, solver="idastar")
+        if self.status != "solved":
+            return None
+        if self.table is not None:
+            self._store_solution(root)
+        return list(self._path)
+
+    def _estimate(self, state, key):
+        estimate = self.heuristic(state)
+        if self.table is not None:
+            stored = self.table.get(key)
+            if stored is not None and stored > estimate:
+                estimate = stored
+        return estimate
+
+    def _store_solution(self, root):
+        # States on an optimal path know their exact distance to the solution
+        state = root
+        for depth, move in enumerate(self._path):
+            self.table.store(self._keyer(state), len(self._path) - depth)
+            state = apply_move(state, *move)
+
+    def _search(self, state, key, g, bound, last_move):
+        """
+        Return (result, sound). 'result' is True when solved, otherwise the smallest f
+        value above 'bound' (None when the subtree has no way out). 'sound' is False when
+        children were skipped for being on the current path, in which case the result
+        depends on the path and must not be stored in the table.
+        """
+        f = g + self._estimate(state, key)
+        if f > bound:
+            return f, True
+        if is_solved_state(state, self.capacity):
+            return True, True
+
+        self.nodes_expanded += 1
+        if self.nodes_expanded > self.max_nodes:
+            self.status = "node_limit"
+            return None, False
+        if self.nodes_expanded % 1024 == 0:
+            if self.time_limit is not None and time.perf_counter() - self._start_time > self.time_limit:
+                self.status = "timeout"
+                return None, False
+            if self.stop_event is not None and self.stop_event.is_set():
+                self.status = "cancelled"
+                return None, False
+
+        # Skipping the reverse of the last pour depends on the path, so it is only done
+        # when no bound gets stored
+        table = self.table
+        minimum = None
+        sound = True
+        for move in legal_moves(state, self.capacity, None if table is not None else last_move):
+            child = apply_move(state, *move)
+            child_key = self._keyer(child)
+            if child_key in self._on_path:
+                sound = False
+                continue
+            if self.prune is not None and self.prune(child):
+                self.nodes_pruned += 1
+                continue  # Unsolvable, contributes no bound
+            self._path.append(move)
+            self._on_path.add(child_key)
+            result, child_sound = self._search(child, child_key, g + 1, bound, move)
+            if result is True:
+                return True, True
+            self._on_path.discard(child_key)
+            self._path.pop()
+            if self.status is not None:
+                return None, False
+            sound = sound and child_sound
+            if result is not None and (minimum is None or result < minimum):
+                minimum = result
+
+        if table is not None and sound:
+            # Every way out of this state costs at least 'minimum - g' more pours
+            table.store(key, minimum - g if minimum is not None else MAX_VALUE)
+        return minimum, sound
@@ -0,0 +1,302 @@
+import math
+import random
+import time
+
+from solver.moves import to_state, legal_moves, apply_move, is_solved_state
+from solver.heuristic import fragments, move_score
+from game.packed import CanonicalKeyer
+from util import metrics
+
+
+def random_policy(state, moves, capacity, rng):
+    return rng.choice(moves)
+
+
+def greedy_policy(state, moves, capacity, rng, epsilon=0.1):
+    """
+    Best 'move_score', ties broken at random; a random move with probability 'epsilon'.
+    """
+    if rng.random() < epsilon:
+        return rng.choice(moves)
+    best_score = -1
+    best = []
+    for move in moves:
+        score = move_score(state, capacity, move)
+        if score > best_score:
+            best_score = score
+            best = [move]
+        elif score == best_score:
+            best.append(move)
+    return rng.choice(best)
+
+
+ROLLOUT_POLICIES = {
+    "random": random_policy,
+    "greedy": greedy_policy,
+}
+
+
+def rollout(task):
+    """
+    Play one simulation from 'state'. Runs in worker processes, so the policy is
+    passed by name. Returns (moves, reward): 'moves' solves the state, or is None.
+
+    A solved rollout scores between 0.5 and 1 (shorter is better); an unsolved one
+    scores up to 0.5 for the fraction of fragments it removed.
+    """
+    state, capacity, policy_name, max_depth, seed = task
+    policy = ROLLOUT_POLICIES[policy_name]
+    rng = random.Random(seed)
+    start_fragments = max(1, fragments(state))
+    seen = {state}
+    moves = []
+    last_move = None
+    while len(moves) < max_depth:
+        if is_solved_state(state, capacity):
+            return moves, 1.0 - len(moves) / (2 * max_depth)
+        # Avoid states this rollout already visited
+        candidates = [move for move in legal_moves(state, capacity, last_move)
+                      if apply_move(state, *move) not in seen]
+        if not candidates:
+            break
+        last_move = policy(state, candidates, capacity, rng)
+        state = apply_move(state, *last_move)
+        seen.add(state)
+        moves.append(last_move)
+    if is_solved_state(state, capacity):
+        return moves, 0.5
+    return None, 0.5 * max(0.0, 1.0 - fragments(state) / start_fragments)
+
+
+class _Node:
+    __slots__ = ("state", "key", "move", "parent", "children", "untried", "visits", "value", "dead")
+
+    def __init__(self, state, key, move, parent):
+        self.state = state
+        self.key = key
+        self.move = move
+        self.parent = parent
+        self.children = []
+        self.untried = None     # Moves not expanded yet, filled on the first visit
+        self.visits = 0
+        self.value = 0.0
+        self.dead = False       # No unvisited way out of this subtree
+
+
+class MCTSSolver:
+    """
+    Monte Carlo Tree Search over pour moves, for boards too large for exact search.
+    Returns the shortest (source, destination) move list found within the budget,
+    not necessarily a minimal one. The search stops early when the solution length
+    reaches the 'fragments' lower bound.
+
+    Leaves are picked with UCT and scored by rollouts with 'rollout_policy' (a name
+    from ROLLOUT_POLICIES). With 'workers' > 1 each round selects 'batch_size' leaves,
+    using 'virtual_loss' pending visits per selected path to spread them out, and runs
+    their rollouts on a process pool. 'progress', if given, is called with the solver
+    whenever a shorter solution is found and every 'report_interval' seconds; 'best'
+    holds the current best solution at any time.
+
+    The search is bounded by 'max_nodes' (tree nodes) and 'time_limit' (seconds);
+    without a solution 'solve' returns None and 'status' tells why. Setting
+    'stop_event' (a threading.Event) from another thread cancels the search. 'prune',
+    if given, is called on every new tree node and drops it when it returns True (see
+    'solver.deadlock.DeadlockDetector').
+    """
+    def __init__(self, capacity, max_nodes=200_000, time_limit=10.0, rollout_policy="greedy", max_depth=None,
+                 exploration=0.7, workers=1, batch_size=None, virtual_loss=1, seed=0, progress=None,
+                 report_interval=1.0, stop_event=None, prune=None):
+        if rollout_policy not in ROLLOUT_POLICIES:
+            raise ValueError(f"Unknown rollout policy '{rollout_policy}', expected one of {sorted(ROLLOUT_POLICIES)}")
+        self.capacity = capacity
+        self.max_nodes = max_nodes
+        self.time_limit = time_limit
+        self.rollout_policy = rollout_policy
+        self.max_depth = max_depth
+        self.exploration = exploration
+        self.workers = workers
+        self.batch_size = batch_size or (1 if workers <= 1 else 16 * workers)
+        self.virtual_loss = virtual_loss
+        self.seed = seed
+        self.progress = progress
+        self.report_interval = report_interval
+        self.stop_event = stop_event
+        self.prune = prune
+
+        self.nodes_expanded = 0
+        self.nodes_pruned = 0
+        self.rollouts = 0
+        self.best = None
+        self.elapsed = 0.0
+        self.status = None
+
+    def solve(self, puzzle):
+        start_time = time.perf_counter()
+        self.nodes_expanded = 0
+        self.nodes_pruned = 0
+        self.rollouts = 0
+        self.best = None
+        self.status = None
+
+        root_state = to_state(puzzle)
+        keyer = CanonicalKeyer(self.capacity)
+        root = _Node(root_state, keyer(root_state), None, None)
+        lower_bound = fragments(root_state)
+        max_depth = self.max_depth or 4 * sum(len(bottle) for bottle in root_state) + 8
+        rng = random.Random(self.seed)
+        self._keyer = keyer
+        self._start_time = start_time
+        self._next_report = start_time + self.report_interval
+
+        if is_solved_state(root_state, self.capacity):
+            self.best = []
+            lower_bound = 0
+        executor = None
+        if self.workers > 1:
+            # Imported here so that importing the solvers stays cheap
+            from concurrent.futures import ProcessPoolExecutor
+            executor = ProcessPoolExecutor(max_workers=self.workers)
+        try:
+            while self.status is None:
+                if self.best is not None and len(self.best) <= lower_bound:
+                    break  # Provably optimal
+                if root.dead:
+                    if self.best is None:
+                        self.status = "unsolvable"
+                    break
+                self._check_budget()
+                if self.status is not None:
+                    break
+
+                leaves = []
+                for _ in range(self.batch_size):
+                    leaf = self._select(root)
+                    if leaf is None:
+                        break
+                    leaves.append(leaf)
+                if not leaves:
+                    continue
+
+                tasks = [(leaf.state, self.capacity, self.rollout_policy, max_depth, rng.getrandbits(32))
+                         for leaf in leaves]
+                if executor is not None:
+                    # One chunk per worker: rollouts are short, round trips are not
+                    results = executor.map(rollout, tasks, chunksize=-(-len(tasks) // self.workers))
+                else:
+                    results = map(rollout, tasks)
+                for leaf, (moves, reward) in zip(leaves, results):
+                    self.rollouts += 1
+                    if moves is not None:
+                        self._offer(self._path_to(leaf) + moves)
+                    self._backpropagate(leaf, reward)
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
+
+        if self.best is not None:
+            self.status = "solved"
+        self.elapsed = time.perf_counter() - start_time
+        if metrics.enabled:
+            metrics.count("solver_runs", solver="mcts", status=self.status)
+            metrics.count("solver_nodes_expanded", self.nodes_expanded, solver="mcts")
+            metrics.count("solver_rollouts", self.rollouts, solver="mcts")
+            metrics.count("solver_nodes_pruned", self.nodes_pruned, solver="mcts")
+            metrics.observe("solver_seconds", self.elapsed, solver="mcts")
+        if self.progress is not None:
+            self.progress(self)
+        return None if self.best is None else list(self.best)
+
+    def _check_budget(self):
+        now = time.perf_counter()
+        if self.nodes_expanded >= self.max_nodes:
+            self.status = "node_limit"
+        elif self.time_limit is not None and now - self._start_time > self.time_limit:
+            self.status = "timeout"
+        elif self.stop_event is not None and self.stop_event.is_set():
+            self.status = "cancelled"
+        elif self.progress is not None and now >= self._next_report:
+            self._next_report = now + self.report_interval
+            self.elapsed = now - self._start_time
+            self.progress(self)
+
+    def _select(self, root):
+        """
+        Walk down by UCT and expand one child. Adds virtual loss along the path.
+        Returns the new leaf, or None if the walk ended in a dead end.
+        """
+        node = root
+        on_path = {root.key}
+        capacity = self.capacity
+        while True:
+            node.visits += self.virtual_loss
+            if node.untried is None:
+                moves = list(legal_moves(node.state, capacity, node.move))
+                # Pop from the end: most promising moves get expanded first
+                moves.sort(key=lambda move: move_score(node.state, capacity, move))
+                node.untried = moves
+
+            while node.untried:
+                move = node.untried.pop()
+                state = apply_move(node.state, *move)
+                key = self._keyer(state)
+                if key in on_path:
+                    continue  # Returns to a state of the current path
+                if self.prune is not None and self.prune(state):
+                    self.nodes_pruned += 1
+                    continue
+                child = _Node(state, key, move, node)
+                node.children.append(child)
+                self.nodes_expanded += 1
+                child.visits += self.virtual_loss
+                if is_solved_state(state, capacity):
+                    self._offer(self._path_to(child))
+                    child.dead = True
+                return child
+
+            live = [child for child in node.children if not child.dead]
+            if not live:
+                self._mark_dead(node)
+                self._revert(node)
+                return None
+            log_visits = math.log(max(node.visits, 1))
+            exploration = self.exploration
+            node = max(live, key=lambda child: child.value / max(child.visits, 1)
+                       + exploration * math.sqrt(log_visits / max(child.visits, 1)))
+            on_path.add(node.key)
+
+    def _mark_dead(self, node):
+        node.dead = True
+        parent = node.parent
+        while parent is not None and parent.untried is not None and not parent.untried \
+                and all(child.dead for child in parent.children):
+            parent.dead = True
+            parent = parent.parent
+
+    def _revert(self, node):
+        # Undo the virtual loss of a selection that produced no leaf
+        while node is not None:
+            node.visits -= self.virtual_loss
+            node = node.parent
+
+    def _backpropagate(self, node, reward):
+        # Replace the virtual loss by one real visit
+        correction = 1 - self.virtual_loss
+        while node is not None:
+            node.visits += correction
+            node.value += reward
+            node = node.parent
+
+    def _path_to(self, node):
+        moves = []
+        while node.parent is not None:
+            moves.append(node.move)
+            node = node.parent
+        moves.reverse()
+        return moves
+
+    def _offer(self, moves):
+        if self.best is None or len(moves) < len(self.best):
+            self.best = moves
+            if self.progress is not None:
+                self.elapsed = time.perf_counter() - self._start_time
+                self.progress(self)
@@ -0,0 +1,86 @@
+def to_state(puzzle):
+    """
+    Convert a 'Game.puzzle' (list of lists) into an immutable state (tuple of tuples).
+    """
+    return tuple(tuple(bottle) for bottle in puzzle)
+
+
+def to_puzzle(state):
+    """
+    Convert an immutable state back into the list-of-lists shape used by 'Game.puzzle'.
+    """
+    return [list(bottle) for bottle in state]
+
+
+def top_run(bottle):
+    """
+    Return (top color, number of consecutive top cells with that color) of a bottle.
+    An empty bottle returns (0, 0).
+    """
+    if not bottle:
+        return 0, 0
+    top_color = bottle[-1]
+    run = 1
+    while run < len(bottle) and bottle[-(run + 1)] == top_color:
+        run += 1
+    return top_color, run
+
+
+def is_solved_state(state, capacity):
+    """
+    Same rule as 'Game.is_solved': every bottle is either empty or full of one color.
+    """
+    for bottle in state:
+        if bottle and (len(bottle) != capacity or bottle.count(bottle[0]) != capacity):
+            return False
+    return True
+
+
+def legal_moves(state, capacity, last_move=None):
+    """
+    Yield every (source, destination) pour allowed by 'Game.move', minus moves that
+    can never be part of a shortest solution:
+      - pouring from a bottle that is already complete (full and single colored),
+      - pouring a single colored bottle into an empty one (only permutes bottles),
+      - pouring to more than one empty bottle (they are interchangeable),
+      - immediately pouring back the last move.
+    """
+    tops = [top_run(bottle) for bottle in state]
+    first_empty = None
+    for index, bottle in enumerate(state):
+        if not bottle:
+            first_empty = index
+            break
+
+    for source, bottle in enumerate(state):
+        if not bottle:
+            continue
+        color, run = tops[source]
+        solid = run == len(bottle)
+        if solid and run == capacity:
+            continue  # Complete bottle, nothing to gain
+        for destination, dest_bottle in enumerate(state):
+            if destination == source:
+                continue
+            if dest_bottle:
+                if tops[destination][0] != color or capacity - len(dest_bottle) < run:
+                    continue
+            else:
+                if solid or destination != first_empty:
+                    continue
+            if last_move is not None and last_move == (destination, source):
+                continue
+            yield source, destination
+
+
+def apply_move(state, source, destination):
+    """
+    Return the state after pouring the top run of 'source' into 'destination'.
+    The move must come from 'legal_moves'; it is not validated again here.
+    """
+    source_bottle = state[source]
+    _, run = top_run(source_bottle)
+    bottles = list(state)
+    bottles[destination] = state[destination] + source_bottle[-run:]
+    bottles[source] = source_bottle[:-run]
+    return tuple(bottles)
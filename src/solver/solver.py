@@ -0,0 +1,35 @@
+from solver.astar import AStarSolver
+from solver.idastar import IDAStarSolver
+
+
+def _mcts_solver(capacity, **options):
+    # Imported on demand, so A* and IDA* runs never load MCTS
+    from solver.mcts import MCTSSolver
+    return MCTSSolver(capacity, **options)
+
+
+SOLVERS = {
+    "astar": AStarSolver,
+    "idastar": IDAStarSolver,
+    "mcts": _mcts_solver,
+}
+
+
+def create_solver(method, capacity, **options):
+    """
+    Build a solver by name ('astar', 'idastar' or 'mcts').
+    """
+    if method not in SOLVERS:
+        raise ValueError(f"Unknown solver '{method}', expected one of {sorted(SOLVERS)}")
+    return SOLVERS[method](capacity, **options)
+
+
+def solve(game, method="astar", **options):
+    """
+    Solve the current 'game.puzzle'. Returns a list of (source, destination) moves that
+    can be replayed with 'Game.move', or None if no solution was found within the
+    budget. 'astar' and 'idastar' return a minimal list; 'mcts' returns the shortest
+    one it found, which need not be minimal.
+    """
+    solver = create_solver(method, game.capacity, **options)
+    return solver.solve(game.puzzle)
@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import time
+from multiprocessing import Pool
+
+import numpy as np
+
+from game.generator import shuffled_puzzles
+from solver.solver import create_solver
+from util.util import print_info, print_error
+
+
+def instance_puzzle(seed, num_bottles, capacity, num_colors, index):
+    """
+    Deterministic puzzle number 'index' of a configuration for a sweep 'seed'.
+    """
+    sequence = np.random.SeedSequence(seed, spawn_key=(num_bottles, capacity, num_colors, index))
+    cells, heights = shuffled_puzzles(np.random.default_rng(sequence), 1, num_bottles, capacity, num_colors)
+    return [bottle[:height] for bottle, height in zip(cells[0].tolist(), heights[0].tolist())]
+
+
+def _solve_instance(task):
+    """
+    Generate and solve one instance. Runs in worker processes.
+    """
+    seed, (num_bottles, capacity, num_colors), index, method, solver_options = task
+    puzzle = instance_puzzle(seed, num_bottles, capacity, num_colors, index)
+    solver = create_solver(method, capacity, **solver_options)
+    solution = solver.solve(puzzle)
+
+    if solver.status == "solved":
+        solvable = True
+    elif solver.status == "unsolvable":
+        solvable = False
+    else:
+        solvable = None  # Budget exceeded, unknown
+
+    return {
+        "num_bottles": num_bottles,
+        "capacity": capacity,
+        "num_colors": num_colors,
+        "index": index,
+        "puzzle": puzzle,
+        "status": solver.status,
+        "solvable": solvable,
+        "solution_length": len(solution) if solution is not None else None,
+        "nodes_expanded": solver.nodes_expanded,
+        "solve_time": solver.elapsed,
+    }
+
+
+def completed_instances(output):
+    """
+    Read an existing results file and return the set of (bottles, capacity, colors, index)
+    already written. A truncated last line from an interrupted run is ignored.
+    """
+    done = set()
+    if not os.path.exists(output):
+        return done
+    with open(output, "r") as results:
+        for line in results:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                continue
+            done.add((row["num_bottles"], row["capacity"], row["num_colors"], row["index"]))
+    return done
+
+
+def check_params(output, params):
+    """
+    Make sure 'output' holds results of a run with the same 'params' (seed, method,
+    solver options), which are kept next to it in '<output>.params.json'. A new or
+    empty results file gets a fresh params file. Raises ValueError on a mismatch.
+    """
+    params_path = output + ".params.json"
+    if os.path.exists(output) and os.path.getsize(output) > 0:
+        if not os.path.exists(params_path):
+            raise ValueError(f"'{output}' has no '{params_path}', so its run settings are unknown")
+        with open(params_path) as params_file:
+            previous = json.load(params_file)
+        # Rows from another seed or solver budget would describe other runs: never mix them
+        changed = [key for key in params if previous.get(key) != params[key]]
+        if changed:
+            raise ValueError(f"'{output}' holds a sweep with different settings ({', '.join(changed)})")
+        return
+    with open(params_path + ".tmp", "w") as params_file:
+        json.dump(params, params_file, indent=2)
+    os.replace(params_path + ".tmp", params_path)
+
+
+def run_sweep(configs, count, output, seed=0, method="astar", solver_options=None, workers=None):
+    """
+    Generate and solve 'count' instances of every (num_bottles, capacity, num_colors)
+    configuration on a process pool and append one JSON line per instance to 'output'.
+
+    Tasks are handed out one at a time, so idle workers pick up the next instance as
+    soon as they finish. Instances already present in 'output' are skipped, which makes
+    an interrupted run resume where it stopped; resuming with another seed, method or
+    solver options raises ValueError (see 'check_params'). The configurations and
+    index of each instance are in its row, so the grid and 'count' may grow between
+    runs. Returns the number of instances solved in this call.
+    """
+    solver_options = dict(solver_options or {"max_nodes": 500_000, "time_limit": 30})
+    check_params(output, {"seed": seed, "method": method, "solver_options": solver_options})
+    done = completed_instances(output)
+    tasks = [
+        (seed, tuple(config), index, method, solver_options)
+        for config in configs
+        for index in range(count)
+        if (*config, index) not in done
+    ]
+    if not tasks:
+        print_info(f"Nothing to do, {len(done)} instances already in {output}.")
+        return 0
+
+    print_info(f"Solving {len(tasks)} instances ({len(done)} already done).")
+    start = time.perf_counter()
+    written = 0
+    with open(output, "a") as results, Pool(processes=workers) as pool:
+        # Make sure a truncated line from a killed run does not glue onto the next row
+        if results.tell() > 0:
+            with open(output, "rb") as check:
+                check.seek(-1, os.SEEK_END)
+                if check.read(1) != b"\n":
+                    results.write("\n")
+        for row in pool.imap_unordered(_solve_instance, tasks, chunksize=1):
+            results.write(json.dumps(row) + "\n")
+            results.flush()
+            written += 1
+            if written % 100 == 0:
+                elapsed = time.perf_counter() - start
+                print_info(f"{written}/{len(tasks)} instances, {written / elapsed:.1f}/s")
+
+    print_info(f"Sweep finished: {written} instances in {time.perf_counter() - start:.1f}s.")
+    return written
+
+
+def parse_config(text):
+    """
+    Parse 'BOTTLES,CAPACITY,COLORS' into a tuple of ints.
+    """
+    values = tuple(int(value) for value in text.split(","))
+    if len(values) != 3:
+        raise argparse.ArgumentTypeError(f"Expected BOTTLES,CAPACITY,COLORS, got '{text}'")
+    return values
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Solve a grid of puzzle configurations in parallel.")
+    parser.add_argument("configs", nargs="+", type=parse_config, help="BOTTLES,CAPACITY,COLORS")
+    parser.add_argument("--count", type=int, default=100, help="Instances per configuration")
+    parser.add_argument("--output", default="sweep.jsonl")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--method", default="astar")
+    parser.add_argument("--max-nodes", type=int, default=500_000)
+    parser.add_argument("--time-limit", type=float, default=30)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    try:
+        run_sweep(
+            args.configs, args.count, args.output, seed=args.seed, method=args.method,
+            solver_options={"max_nodes": args.max_nodes, "time_limit": args.time_limit},
+            workers=args.workers,
+        )
+    except ValueError as e:
+        print_error(str(e))
+        raise SystemExit(1)
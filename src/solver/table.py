@@ -0,0 +1,159 @@
+import mmap
+import os
+import struct
+import sys
+from collections import OrderedDict
+
+MAGIC = b"WSTT"
+HEADER = struct.Struct("<4sIQ")   # magic, key size, number of entries
+VALUE = struct.Struct("<H")       # stored value (distance lower bound)
+MAX_VALUE = 0xFFFF
+
+POLICIES = ("lru", "depth")
+
+
+class TranspositionTable:
+    """
+    Bounded map from packed state keys (see 'game.packed') to small integers, used by
+    the solvers to remember distance-to-solve lower bounds.
+
+    The number of entries is derived from 'max_bytes'. When full, entries are replaced
+    according to 'policy':
+      - "lru":   drop the least recently used entry,
+      - "depth": fixed slot array indexed by hash; a colliding entry only replaces the
+                 slot if its value (search depth it saves) is at least as large.
+
+    'save' and 'load' persist the table to a flat file read through mmap, so repeated
+    runs on the same puzzle family start warm. Keys must all be 'key_size' bytes.
+    """
+    def __init__(self, key_size, max_bytes=256 * 1024 * 1024, policy="lru"):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown policy '{policy}', expected one of {POLICIES}")
+        self.key_size = key_size
+        self.policy = policy
+
+        # Rough per-entry cost in CPython: the key object plus container overhead
+        entry_bytes = sys.getsizeof(bytes(key_size)) + (104 if policy == "lru" else 16)
+        self.max_entries = max(1, max_bytes // entry_bytes)
+
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+        if policy == "lru":
+            self._entries = OrderedDict()
+        else:
+            self._keys = [None] * self.max_entries
+            self._values = [0] * self.max_entries
+
+    def __len__(self):
+        if self.policy == "lru":
+            return len(self._entries)
+        return self.max_entries - self._keys.count(None)
+
+    def get(self, key):
+        """
+        Return the value stored for 'key', or None.
+        """
+        if self.policy == "lru":
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+        slot = hash(key) % self.max_entries
+        if self._keys[slot] == key:
+            self.hits += 1
+            return self._values[slot]
+        self.misses += 1
+        return None
+
+    def store(self, key, value):
+        """
+        Store 'value' for 'key'. Values are clamped to the on-disk range.
+        """
+        value = min(value, MAX_VALUE)
+        self.stores += 1
+        if self.policy == "lru":
+            entries = self._entries
+            if key in entries:
+                entries.move_to_end(key)
+            elif len(entries) >= self.max_entries:
+                entries.popitem(last=False)
+                self.evictions += 1
+            entries[key] = value
+            return
+
+        slot = hash(key) % self.max_entries
+        current = self._keys[slot]
+        if current is not None and current != key:
+            if value < self._values[slot]:
+                return  # Keep the deeper entry
+            self.evictions += 1
+        self._keys[slot] = key
+        self._values[slot] = value
+
+    def items(self):
+        if self.policy == "lru":
+            return list(self._entries.items())
+        return [(key, value) for key, value in zip(self._keys, self._values) if key is not None]
+
+    def clear(self):
+        if self.policy == "lru":
+            self._entries.clear()
+        else:
+            self._keys = [None] * self.max_entries
+            self._values = [0] * self.max_entries
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate(),
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
+
+    def save(self, filename):
+        """
+        Write every entry to 'filename' as fixed-size records (key bytes + uint16).
+        """
+        items = self.items()
+        with open(filename, "wb") as table_file:
+            table_file.write(HEADER.pack(MAGIC, self.key_size, len(items)))
+            for key, value in items:
+                table_file.write(key)
+                table_file.write(VALUE.pack(value))
+
+    def load(self, filename):
+        """
+        Load entries saved by 'save' through a memory map. Returns the number of entries
+        read; loading stops being useful once the table is full, since older entries
+        are then evicted.
+        """
+        if not os.path.exists(filename) or os.path.getsize(filename) < HEADER.size:
+            return 0
+        with open(filename, "rb") as table_file:
+            with mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                magic, key_size, count = HEADER.unpack_from(data, 0)
+                if magic != MAGIC or key_size != self.key_size:
+                    raise ValueError(f"'{filename}' is not a table for {self.key_size}-byte keys")
+                record_size = key_size + VALUE.size
+                offset = HEADER.size
+                for _ in range(count):
+                    key = data[offset:offset + key_size]
+                    (value,) = VALUE.unpack_from(data, offset + key_size)
+                    self.store(key, value)
+                    offset += record_size
+        self.stores -= count  # Loading is not search activity
+        return count
@@ -0,0 +1,236 @@
+"""
+Retrograde distance-to-solve tablebase for small configurations.
+
+The index is an open-addressed hash table rather than a perfect hash or a
+combinatorial rank. A rank of raw layouts is dense only before the symmetry
+reduction, and 'SymmetricKeyer' shrinks the table by up to num_bottles! *
+num_colors!, far more than a rank saves. Canonical classes have no closed-form
+rank. Lookups must also tell an unsolvable state (absent) from a solvable one, so
+each entry keeps its key either way; a minimal perfect hash would only save the
+free slots. Each state takes one slot of 'num_bottles * capacity + 1' bytes (key
+and distance). With 2 to 4 slots per state (power of two, load at most 1/2),
+that is 50-100 bytes per state for 6 bottles of capacity 4.
+"""
+import itertools
+import mmap
+import struct
+import zlib
+
+from solver.moves import top_run, apply_move, legal_moves
+from util.util import print_info
+
+MAGIC = b"WSTB"
+HEADER = struct.Struct("<4sHHHQQH")  # magic, bottles, capacity, colors, slots, states, max distance
+MAX_DISTANCE = 254
+
+
+def solved_state(num_bottles, capacity, num_colors):
+    """
+    The single solved layout of a configuration, up to bottle order.
+    """
+    bottles = [(color,) * capacity for color in range(1, num_colors + 1)]
+    bottles.extend(() for _ in range(num_bottles - num_colors))
+    return tuple(bottles)
+
+
+class SymmetricKeyer:
+    """
+    Canonical key of a state up to bottle order *and* color relabeling; the distance
+    to solve is the same for all of them, which shrinks the table by up to
+    num_colors! on top of the bottle-order reduction of 'game.packed.canonical'.
+
+    Colors are ordered by a relabeling-invariant signature (heights and positions of
+    their cells); only colors with equal signatures are tried in every order, and the
+    smallest packed, bottle-sorted result is the key. States are tuples of bottles
+    given as bytes or tuples.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.padding = [bytes(capacity - height) for height in range(capacity + 1)]
+
+    def __call__(self, state):
+        capacity = self.capacity
+        padding = self.padding
+        bottles = [bytes(bottle) for bottle in state]
+
+        signatures = {}
+        for bottle in bottles:
+            base = len(bottle) * (capacity + 1)
+            for position, color in enumerate(bottle):
+                signatures.setdefault(color, []).append(base + position)
+        ranked = sorted((sorted(cells), color) for color, cells in signatures.items())
+
+        # Group colors that the signature cannot tell apart
+        groups = []
+        previous = None
+        for signature, color in ranked:
+            if signature == previous:
+                groups[-1].append(color)
+            else:
+                groups.append([color])
+            previous = signature
+
+        labels = bytes(range(1, len(ranked) + 1))
+        best = None
+        for orders in itertools.product(*(itertools.permutations(group) for group in groups)):
+            table = bytes.maketrans(bytes(itertools.chain.from_iterable(orders)), labels)
+            key = b"".join(sorted([bottle.translate(table) + padding[len(bottle)] for bottle in bottles]))
+            if best is None or key < best:
+                best = key
+        return best
+
+
+def key_to_state(key, capacity):
+    """
+    Turn a packed key back into a tuple of bytes bottles.
+    """
+    return tuple(key[i:i + capacity].rstrip(b"\x00") for i in range(0, len(key), capacity))
+
+
+def predecessors(state, capacity):
+    """
+    Yield every state from which one forward pour ('Game.move' semantics) leads to
+    'state'. A pour moved the whole top run of the source, so it is undone by taking
+    k cells of color c off the top of a bottle and putting them back on a bottle whose
+    top is not c.
+    """
+    for destination, bottle in enumerate(state):
+        if not bottle:
+            continue
+        color, run = top_run(bottle)
+        for count in range(1, run + 1):
+            if count == run and run != len(bottle):
+                continue  # The destination had another color under the pour
+            remaining = bottle[:-count]
+            poured = bottle[-count:]
+            for source, source_bottle in enumerate(state):
+                if source == destination:
+                    continue
+                if source_bottle and source_bottle[-1] == color:
+                    continue  # The pour would have moved these cells too
+                if len(source_bottle) + count > capacity:
+                    continue
+                bottles = list(state)
+                bottles[destination] = remaining
+                bottles[source] = source_bottle + poured
+                yield tuple(bottles)
+
+
+def build_tablebase(num_bottles, capacity, num_colors, filename):
+    """
+    Retrograde BFS from the solved state over reverse pours, then write the
+    distance-to-solve of every state that can still be solved to 'filename', one entry
+    per class of states equal up to bottle order and color relabeling.
+
+    The file is an open-addressed hash table (load factor at most 1/2) of fixed-size
+    slots (packed key + one byte holding distance + 1, 0 marks a free slot), so
+    'Tablebase' answers a lookup by mapping the file and probing a couple of slots.
+    Returns the number of states.
+    """
+    keyer = SymmetricKeyer(capacity)
+    root_key = keyer(solved_state(num_bottles, capacity, num_colors))
+    distances = {root_key: 0}
+    frontier = [root_key]  # Keys are the compact form kept between levels
+    distance = 0
+
+    while frontier:
+        distance += 1
+        if distance > MAX_DISTANCE:
+            raise ValueError("Distance to solve does not fit in one byte.")
+        next_frontier = []
+        for state_key in frontier:
+            for previous in predecessors(key_to_state(state_key, capacity), capacity):
+                key = keyer(previous)
+                if key not in distances:
+                    distances[key] = distance
+                    next_frontier.append(key)
+        frontier = next_frontier
+        if frontier:
+            print_info(f"Distance {distance}: {len(frontier)} states")
+
+    key_size = num_bottles * capacity
+    slot_size = key_size + 1
+    slots = 1
+    while slots < 2 * len(distances):
+        slots *= 2
+    mask = slots - 1
+
+    table = bytearray(slots * slot_size)
+    for key, value in distances.items():
+        slot = zlib.crc32(key) & mask
+        while table[slot * slot_size + key_size]:
+            slot = (slot + 1) & mask
+        offset = slot * slot_size
+        table[offset:offset + key_size] = key
+        table[offset + key_size] = value + 1
+
+    with open(filename, "wb") as tablebase_file:
+        tablebase_file.write(HEADER.pack(MAGIC, num_bottles, capacity, num_colors, slots,
+                                         len(distances), max(distances.values())))
+        tablebase_file.write(table)
+    return len(distances)
+
+
+class Tablebase:
+    """
+    Read-only, memory-mapped distance-to-solve lookup built by 'build_tablebase'.
+    """
+    def __init__(self, filename):
+        self._file = open(filename, "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.num_bottles, self.capacity, self.num_colors,
+         self.slots, self.states, self.max_distance) = HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"'{filename}' is not a tablebase file")
+        self._key_size = self.num_bottles * self.capacity
+        self._slot_size = self._key_size + 1
+        self._keyer = SymmetricKeyer(self.capacity)
+
+    def close(self):
+        self._data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _lookup_key(self, key):
+        data = self._data
+        mask = self.slots - 1
+        key_size = self._key_size
+        slot_size = self._slot_size
+        slot = zlib.crc32(key) & mask
+        while True:
+            offset = HEADER.size + slot * slot_size
+            value = data[offset + key_size]
+            if not value:
+                return None  # Free slot, state is not solvable
+            if data[offset:offset + key_size] == key:
+                return value - 1
+            slot = (slot + 1) & mask
+
+    def lookup(self, puzzle):
+        """
+        Return the number of pours left to solve 'puzzle' optimally, or None when the
+        puzzle can no longer be solved.
+        """
+        if len(puzzle) != self.num_bottles:
+            raise ValueError(f"Tablebase is for {self.num_bottles} bottles, got {len(puzzle)}")
+        return self._lookup_key(self._keyer(puzzle))
+
+    def best_move(self, puzzle):
+        """
+        Return a (source, destination) pour on an optimal path, or None when the puzzle
+        is solved or unsolvable.
+        """
+        distance = self.lookup(puzzle)
+        if not distance:
+            return None
+        state = tuple(bytes(bottle) for bottle in puzzle)
+        for move in legal_moves(state, self.capacity):
+            if self._lookup_key(self._keyer(apply_move(state, *move))) == distance - 1:
+                return move
+        return None
@@ -0,0 +1,225 @@
+# metrics.py
+
+"""
+Opt-in counters and histograms for the engine, the GUI and the solvers.
+
+Instrumented code checks the module-level 'enabled' flag before recording, so the
+cost while disabled is one attribute lookup per call site:
+
+    from util import metrics
+    if metrics.enabled:
+        metrics.count("game_moves_rejected", reason="no_space")
+
+Call 'enable()' to start collecting into the in-process 'registry'. The data can be
+read with 'registry.snapshot()', written periodically with 'JSONDumper' or scraped
+from a local Prometheus-style text endpoint started with 'PrometheusServer'.
+"""
+import bisect
+import json
+import threading
+import time
+
+from util.util import print_info
+
+# Upper bounds (seconds) for timing histograms; values above the last land in +Inf
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+
+enabled = False
+
+# Histogram name -> bucket upper bounds, for series that are not timings
+bucket_layouts = {}
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus style.
+    """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def snapshot(self):
+        return {
+            "buckets": list(self.buckets),
+            "counts": list(self.counts),
+            "sum": self.total,
+            "count": self.count,
+        }
+
+
+class Registry:
+    """
+    In-process store of counters and histograms. Series are identified by a name and
+    a sorted tuple of (label, value) pairs.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def count(self, name, amount=1, labels=()):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels=()):
+        key = (name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = Histogram(bucket_layouts.get(name, DEFAULT_BUCKETS))
+                self.histograms[key] = histogram
+            histogram.observe(value)
+
+    def clear(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        """
+        Return a JSON-serializable copy of every series.
+        """
+        with self.lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "histograms": [
+                    {"name": name, "labels": dict(labels), **histogram.snapshot()}
+                    for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0])
+                ],
+            }
+
+    def prometheus_text(self):
+        """
+        Render every series in the Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+            for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                    cumulative += bucket_count
+                    bucket_labels = labels + (("le", str(bound)),)
+                    lines.append(f"{name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {histogram.total}")
+                lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{label}="{value}"' for label, value in labels) + "}"
+
+
+registry = Registry()
+
+
+def enable(target=None):
+    """
+    Start collecting. With 'target' the data goes to that registry instead of the default one.
+    """
+    global enabled, registry
+    if target is not None:
+        registry = target
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def count(name, amount=1, **labels):
+    registry.count(name, amount, tuple(sorted(labels.items())))
+
+
+def observe(name, value, **labels):
+    registry.observe(name, value, tuple(sorted(labels.items())))
+
+
+def define_histogram(name, buckets):
+    """
+    Use 'buckets' instead of 'DEFAULT_BUCKETS' for every series named 'name'.
+    """
+    bucket_layouts[name] = tuple(buckets)
+
+
+class JSONDumper:
+    """
+    Write 'registry.snapshot()' to 'filename' every 'interval' seconds from a daemon
+    thread, and once more on 'close'.
+    """
+    def __init__(self, filename, interval=10.0, target=None):
+        self.filename = filename
+        self.interval = interval
+        self.target = target
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.dump()
+
+    def dump(self):
+        snapshot = (self.target or registry).snapshot()
+        snapshot["time"] = time.time()
+        with open(self.filename, "w") as output:
+            json.dump(snapshot, output, indent=2)
+
+    def close(self):
+        self.stop_event.set()
+        self.thread.join()
+        self.dump()
+
+
+class PrometheusServer:
+    """
+    Serve 'registry.prometheus_text()' at http://host:port/metrics from a daemon thread.
+    Binds to localhost by default.
+    """
+    def __init__(self, port=9464, host="127.0.0.1", target=None):
+        # Imported here: http.server is slow to import and most processes never serve
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = (server.target or registry).prometheus_text().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # Keep stdout for the game
+
+        self.target = target
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.port = self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        print_info(f"Serving metrics on http://{host}:{self.port}/metrics")
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        self.thread.join()